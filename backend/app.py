@@ -1,6 +1,6 @@
 from flask_cors import CORS
 from config import SECRET_KEY, JWT_SECRET_KEY
-from extensions import jwt, socketio
+from extensions import jwt, socketio, ensure_indexes
 from agents.orchestrator import startup_ai_orchestrator
 from routes.auth_routes import auth_bp
 from routes.ai_routes import ai_bp
@@ -14,6 +14,9 @@ from routes.funding_routes import funding_bp
 from routes.notification_routes import notifications_bp
 from apscheduler.schedulers.background import BackgroundScheduler
 from jobs.reminders import send_inactivity_reminders
+from jobs.match_feeds import refresh_match_feeds
+from jobs.embedding_backfill import backfill_user_embeddings
+from jobs.people_index import maintain_people_indexes
 from routes.mentorship_routes import mentorship_bp
 from routes.matchmaking_routes import matchmaking_bp
 import atexit
@@ -60,6 +63,38 @@ app.register_blueprint(funding_bp, url_prefix="/api/funding")
 app.register_blueprint(notifications_bp, url_prefix="/api/notifications")
 app.register_blueprint(mentorship_bp, url_prefix="/api/mentorship")
 app.register_blueprint(matchmaking_bp, url_prefix="/api/match")
+
+ensure_indexes()
+
+scheduler = BackgroundScheduler(daemon=True)
+scheduler.add_job(
+    refresh_match_feeds,
+    "interval",
+    minutes=int(os.environ.get("MATCH_FEED_REFRESH_MINUTES", 5)),
+    id="refresh_match_feeds",
+    max_instances=1,
+    coalesce=True,
+)
+scheduler.add_job(
+    backfill_user_embeddings,
+    "interval",
+    minutes=int(os.environ.get("EMBEDDING_BACKFILL_MINUTES", 2)),
+    id="backfill_user_embeddings",
+    max_instances=1,
+    coalesce=True,
+)
+scheduler.add_job(
+    maintain_people_indexes,
+    "interval",
+    minutes=int(os.environ.get("PEOPLE_INDEX_REFRESH_MINUTES", 1)),
+    id="maintain_people_indexes",
+    max_instances=1,
+    coalesce=True,
+)
+scheduler.start()
+atexit.register(lambda: scheduler.shutdown(wait=False))
+
+
 @app.route("/")
 def home():
     return {"message": "ProjectHub backend is running 🚀"}
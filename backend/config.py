@@ -12,4 +12,8 @@ JWT_HEADER_NAME = "Authorization"
 JWT_HEADER_TYPE = "Bearer"
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=8)
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
\ No newline at end of file
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+PEOPLE_INDEX_DIR = os.getenv(
+    "PEOPLE_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "rag", "indexes", "people"),
+)
@@ -0,0 +1,214 @@
+# Email deduplication migration: merges accounts registered more than once with
+# the same (normalised) email, then enforces uniqueness with an index.
+# Safe to interrupt and re-run; every phase only touches work not yet done.
+# Run from the backend folder:
+#   python dedupe_users.py              # all phases
+#   python dedupe_users.py --dry-run    # report duplicate groups only
+
+import argparse
+from pymongo import UpdateOne, UpdateMany, DeleteMany
+from pymongo.errors import OperationFailure
+from extensions import (
+    db,
+    users_collection,
+    projects_collection,
+    ideas_collection,
+    messages_collection,
+    conversations_collection,
+    tasks_collection,
+    project_invites_collection,
+    project_activity_collection,
+    notifications_collection,
+    match_interests_collection,
+    match_explanations_collection,
+    user_embeddings_collection,
+    match_feeds_collection,
+)
+from utils.emails import EMAIL_INDEX_NAME, normalize_email
+
+MERGED_LIST_FIELDS = ("skills", "interests", "lookingFor", "tags", "connections", "mentees")
+# List fields holding user ids; the merged accounts must not end up in them.
+SELF_REFERENCING_FIELDS = ("connections", "mentees")
+
+# Every field in the schema that stores a user id. Duplicates are deleted
+# after the merge, so anything missing here would be left dangling.
+# (collection, field, stored as ObjectId?) for single-valued user references.
+USER_REFERENCES = [
+    (projects_collection, "owner_id", True),
+    (ideas_collection, "owner_id", True),
+    (tasks_collection, "assignee_id", True),
+    (project_activity_collection, "actor_id", True),
+    (project_invites_collection, "invited_by", True),
+    (messages_collection, "sender_id", False),
+    (messages_collection, "recipient_id", False),
+    (notifications_collection, "user_id", True),
+    (notifications_collection, "actor_id", True),
+    (match_interests_collection, "user_id", True),
+    (match_interests_collection, "target_id", False),
+    (db["connection_requests"], "from_user_id", True),
+    (db["connection_requests"], "to_user_id", True),
+    (db["mentorship_requests"], "student_id", True),
+    (db["mentorship_requests"], "mentor_id", True),
+    (db["mentorship_feedback"], "student_id", True),
+    (db["mentorship_feedback"], "mentor_id", True),
+    (db["funding_applications"], "applicant_id", False),
+]
+# (collection, field, stored as ObjectId?) for arrays of user references.
+USER_ARRAY_REFERENCES = [
+    (projects_collection, "team_members", True),
+    (conversations_collection, "participants", False),
+    (users_collection, "connections", False),
+    (users_collection, "mentees", False),
+]
+# Derived per-user caches: dropped for the merged accounts and rebuilt on demand.
+USER_CACHES = [
+    (user_embeddings_collection, ["user_id"]),
+    (match_feeds_collection, ["user_id"]),
+    (match_explanations_collection, ["user_a_id", "user_b_id"]),
+]
+
+
+def backfill_normalized_emails(batch_size: int) -> int:
+    """Phase 1: set email_normalized on users that don't have it yet."""
+    total = 0
+    while True:
+        batch = list(users_collection.find(
+            {"email_normalized": {"$exists": False}, "email": {"$type": "string"}},
+            {"email": 1},
+        ).limit(batch_size))
+        if not batch:
+            break
+        users_collection.bulk_write([
+            UpdateOne({"_id": u["_id"]}, {"$set": {"email_normalized": normalize_email(u["email"])}})
+            for u in batch
+        ], ordered=False)
+        total += len(batch)
+        print(f"[dedupe] normalised {total} email(s)")
+    return total
+
+
+def find_duplicate_groups(batch_size: int):
+    """Yield lists of user ids sharing an email, newest account first.
+
+    Falls back to normalising "email" on the fly for users not yet
+    backfilled, so a dry run on an unmigrated database sees every group.
+    """
+    pipeline = [
+        {"$match": {"email": {"$type": "string"}}},
+        {"$addFields": {"_dedupe_key": {"$ifNull": [
+            "$email_normalized", {"$toLower": {"$trim": {"input": "$email"}}}
+        ]}}},
+        {"$match": {"_dedupe_key": {"$ne": ""}}},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$group": {"_id": "$_dedupe_key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    for group in users_collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size):
+        yield group["_id"], group["ids"]
+
+
+def _repoint_references(keeper_id, dupe_ids: list):
+    old_oids, old_strs = dupe_ids, [str(d) for d in dupe_ids]
+    for collection, field, as_oid in USER_REFERENCES:
+        old, new = (old_oids, keeper_id) if as_oid else (old_strs, str(keeper_id))
+        collection.bulk_write([UpdateMany({field: {"$in": old}}, {"$set": {field: new}})])
+    for collection, field, as_oid in USER_ARRAY_REFERENCES:
+        old, new = (old_oids, keeper_id) if as_oid else (old_strs, str(keeper_id))
+        collection.bulk_write([
+            UpdateMany({field: {"$in": old}}, {"$addToSet": {field: new}}),
+            UpdateMany({field: {"$in": old}}, {"$pull": {field: {"$in": old}}}),
+        ], ordered=True)
+    # A user must not end up connected to (or mentoring) themselves.
+    users_collection.update_one(
+        {"_id": keeper_id},
+        {"$pull": {field: str(keeper_id) for field in SELF_REFERENCING_FIELDS}},
+    )
+
+
+def merge_group(email: str, ids: list, dry_run: bool = False) -> int:
+    """Phase 2: keep the most recent account, fold the others into it."""
+    accounts = {u["_id"]: u for u in users_collection.find({"_id": {"$in": ids}})}
+    ordered = [accounts[i] for i in ids if i in accounts]
+    if len(ordered) <= 1:
+        return 0
+    keeper, dupes = ordered[0], ordered[1:]
+    dupe_ids = [d["_id"] for d in dupes]
+    print(f"[dedupe] {email}: keeping {keeper['_id']}, merging {len(dupe_ids)} duplicate(s)")
+    if dry_run:
+        return len(dupe_ids)
+
+    merged = {}
+    for field in MERGED_LIST_FIELDS:
+        values = list(keeper.get(field, []))
+        for dupe in dupes:
+            values += [v for v in dupe.get(field, []) if v not in values]
+        merged[field] = values
+    # Links to the merged accounts themselves would become self-links.
+    merged_away = {str(keeper["_id"])} | {str(d) for d in dupe_ids}
+    for field in SELF_REFERENCING_FIELDS:
+        merged[field] = [v for v in merged[field] if str(v) not in merged_away]
+    for field in ("bio", "name", "google_id"):
+        if not keeper.get(field):
+            fallback = next((d[field] for d in dupes if d.get(field)), None)
+            if fallback:
+                merged[field] = fallback
+
+    # Repoint first: if the run stops here, the duplicates still exist and the
+    # group is picked up again on the next run.
+    _repoint_references(keeper["_id"], dupe_ids)
+    users_collection.bulk_write([
+        UpdateOne({"_id": keeper["_id"]}, {"$set": merged}),
+        DeleteMany({"_id": {"$in": dupe_ids}}),
+    ], ordered=True)
+
+    str_ids = [str(d) for d in dupe_ids]
+    for collection, fields in USER_CACHES:
+        collection.bulk_write([DeleteMany({field: {"$in": str_ids}}) for field in fields], ordered=False)
+    # The keeper's feeds were ranked from its pre-merge profile.
+    match_feeds_collection.delete_many({"user_id": str(keeper["_id"])})
+    return len(dupe_ids)
+
+
+def ensure_unique_email_index():
+    """Phase 3: enforce one account per normalised email.
+
+    Empty emails are left out of the index, matching find_duplicate_groups,
+    so accounts without an email never block index creation.
+    """
+    partial = {"email_normalized": {"$type": "string", "$gt": ""}}
+    existing = users_collection.index_information().get(EMAIL_INDEX_NAME)
+    if existing is not None and existing.get("partialFilterExpression") != partial:
+        users_collection.drop_index(EMAIL_INDEX_NAME)
+    users_collection.create_index(
+        "email_normalized",
+        name=EMAIL_INDEX_NAME,
+        unique=True,
+        partialFilterExpression=partial,
+    )
+    print(f"[dedupe] unique index {EMAIL_INDEX_NAME} is in place")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate user accounts by email.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="report duplicates without writing")
+    args = parser.parse_args()
+
+    if not args.dry_run:
+        backfill_normalized_emails(args.batch_size)
+
+    removed = 0
+    for email, ids in find_duplicate_groups(args.batch_size):
+        removed += merge_group(email, ids, dry_run=args.dry_run)
+    print(f"[dedupe] {'would remove' if args.dry_run else 'removed'} {removed} duplicate account(s)")
+
+    if not args.dry_run:
+        try:
+            ensure_unique_email_index()
+        except OperationFailure as e:
+            # New duplicates can arrive between phases; re-running merges them.
+            print(f"[dedupe] could not create unique index, re-run to merge remaining duplicates: {e}")
+
+
+if __name__ == "__main__":
+    main()
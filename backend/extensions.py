@@ -1,6 +1,7 @@
 from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
 import pymongo
+import pymongo.errors
 from config import MONGO_URI
 import os
 from groq import Groq
@@ -33,7 +34,58 @@ project_invites_collection = db.get_collection("project_invites")
 project_activity_collection = db.get_collection("project_activity")
 notifications_collection = db["notifications"]
 knowledge_chunks_collection = db.get_collection("knowledge_chunks")
+knowledge_state_collection = db["knowledge_state"]
 user_embeddings_collection = db["user_embeddings"]
+project_embeddings_collection = db["project_embeddings"]
+embedding_cache_collection = db["embedding_cache"]
 match_explanations_collection = db["match_explanations"]
 match_interests_collection = db["match_interests"]
-gemini_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
\ No newline at end of file
+match_feeds_collection = db["match_feeds"]
+gemini_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+
+_INDEXES = [
+    # users: multikey tags index = tag -> user ids, for /api/users/match
+    (users_collection, [("tags", 1), ("created_at", -1)], {}),
+    (users_collection, [("created_at", -1)], {}),
+    # Only users still waiting for their first embedding are in this index.
+    (users_collection, [("embedding_pending", 1)], {"partialFilterExpression": {"embedding_pending": True}}),
+    # match_interests: both sides of the mutual-like lookup
+    (match_interests_collection, [("user_id", 1), ("target_id", 1), ("action", 1)], {}),
+    (match_feeds_collection, [("user_id", 1), ("feed_type", 1)], {"unique": True}),
+    (match_feeds_collection, [("stale", 1), ("computed_at", 1)], {}),
+    # user_embeddings: per-user lookups, the matrix's incremental sync, role filters
+    (user_embeddings_collection, [("user_id", 1)], {}),
+    (user_embeddings_collection, [("updated_at", 1)], {}),
+    (user_embeddings_collection, [("role", 1)], {}),
+    (knowledge_chunks_collection, [("project_id", 1), ("source_type", 1), ("source_id", 1)], {}),
+]
+_TTL_INDEXES = [
+    (embedding_cache_collection, "created_at", int(os.getenv("EMBED_CACHE_TTL_DAYS", "30")) * 86400),
+]
+
+
+def _ensure_ttl_index(collection, field: str, seconds: int):
+    try:
+        collection.create_index([(field, 1)], expireAfterSeconds=seconds)
+    except pymongo.errors.OperationFailure as e:
+        if e.code != 85:  # IndexOptionsConflict: the TTL changed since the index was made
+            raise
+        db.command("collMod", collection.name, index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds})
+
+
+def ensure_indexes():
+    """Create every index the app relies on; called once at startup.
+
+    Each index is created on its own, so one failure doesn't skip the rest.
+    """
+    for collection, keys, options in _INDEXES:
+        try:
+            collection.create_index(keys, **options)
+        except Exception as e:
+            print(f"[startup] index {collection.name} {keys} failed: {e}")
+    for collection, field, seconds in _TTL_INDEXES:
+        try:
+            _ensure_ttl_index(collection, field, seconds)
+        except Exception as e:
+            print(f"[startup] TTL index {collection.name}.{field} failed: {e}")
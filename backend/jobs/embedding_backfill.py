@@ -0,0 +1,39 @@
+import os
+from datetime import datetime, timedelta
+from extensions import users_collection
+from services.embedding_service import upsert_user_embedding
+
+# Embeds users registered with embedding_pending set; upsert_user_embedding
+# clears the flag. Users are claimed one at a time with a lease, so when the
+# job runs in every worker process each user is embedded by only one of them.
+# Accounts that predate the flag are embedded on their first feed request.
+
+BACKFILL_BATCH = int(os.getenv("MATCH_MATRIX_BACKFILL_BATCH", "25"))
+CLAIM_LEASE_MINUTES = int(os.getenv("EMBEDDING_BACKFILL_CLAIM_MINUTES", "10"))
+
+
+def _claim_pending(limit: int) -> list:
+    now = datetime.utcnow()
+    claimed = []
+    while len(claimed) < limit:
+        user = users_collection.find_one_and_update(
+            {"embedding_pending": True, "embedding_claimed_until": {"$not": {"$gt": now}}},
+            {"$set": {"embedding_claimed_until": now + timedelta(minutes=CLAIM_LEASE_MINUTES)}},
+        )
+        if user is None:
+            break
+        claimed.append(user)
+    return claimed
+
+
+def backfill_user_embeddings(batch: int = BACKFILL_BATCH):
+    """Embed up to batch users still waiting for their first embedding."""
+    embedded = 0
+    for user in _claim_pending(batch):
+        try:
+            upsert_user_embedding(user)
+            embedded += 1
+        except Exception as e:
+            # The claim lapses and another run retries the user.
+            print(f"[embedding_backfill] failed to embed user {user['_id']}: {e}")
+    return {"users_embedded": embedded}
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from datetime import datetime
+from extensions import knowledge_state_collection
+from rag.project_knowledge import upsert_project_knowledge
+
+# In-process queue of "reindex project X" jobs, fed by workspace writes.
+# Pending jobs are deduplicated per project and debounced, so a burst of task
+# edits becomes one rebuild; a write that lands while its project is being
+# rebuilt queues exactly one follow-up run. Job status and duration are kept
+# on the project's knowledge_state document.
+
+WORKERS = int(os.getenv("RAG_INDEX_WORKERS", "2"))
+DEBOUNCE_SECONDS = float(os.getenv("RAG_INDEX_DEBOUNCE_SECONDS", "3"))
+MAX_DELAY_SECONDS = float(os.getenv("RAG_INDEX_MAX_DELAY_SECONDS", "30"))
+
+_cond = threading.Condition()
+_pending = {}       # project_id -> (first_queued_at, due_at), monotonic
+_running = set()
+_workers = []
+_stats = {"enqueued": 0, "coalesced": 0, "succeeded": 0, "failed": 0, "last_duration_ms": 0}
+
+
+def _record(project_id: str, fields: dict):
+    try:
+        knowledge_state_collection.update_one({"_id": project_id}, {"$set": fields}, upsert=True)
+    except Exception as e:
+        print(f"[knowledge_index] could not record status for {project_id}: {e}")
+
+
+def _start_workers():
+    while len(_workers) < WORKERS:
+        worker = threading.Thread(target=_run, name=f"knowledge-index-{len(_workers)}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def enqueue_reindex(project_id, debounce: float = DEBOUNCE_SECONDS):
+    """Queue a rebuild of a project's knowledge index; returns immediately."""
+    project_id = str(project_id)
+    now = time.monotonic()
+    with _cond:
+        _start_workers()
+        entry = _pending.get(project_id)
+        if entry is None:
+            _pending[project_id] = (now, now + debounce)
+            _stats["enqueued"] += 1
+            newly_queued = True
+        else:
+            first_queued_at, _ = entry
+            # Keep pushing the run back while edits arrive, but not forever.
+            _pending[project_id] = (first_queued_at, min(now + debounce, first_queued_at + MAX_DELAY_SECONDS))
+            _stats["coalesced"] += 1
+            newly_queued = False
+        _cond.notify()
+    if newly_queued:
+        _record(project_id, {"job_status": "queued", "job_queued_at": datetime.utcnow()})
+
+
+def _next_job():
+    """Block until a pending project is due and not already being rebuilt."""
+    with _cond:
+        while True:
+            now = time.monotonic()
+            ready = [(due, pid) for pid, (_, due) in _pending.items() if pid not in _running]
+            if ready:
+                due, project_id = min(ready)
+                if due <= now:
+                    del _pending[project_id]
+                    _running.add(project_id)
+                    return project_id
+                _cond.wait(timeout=due - now)
+            else:
+                _cond.wait()
+
+
+def _run():
+    while True:
+        project_id = _next_job()
+        started = time.monotonic()
+        _record(project_id, {"job_status": "running", "job_started_at": datetime.utcnow()})
+        try:
+            result = upsert_project_knowledge(project_id)
+            status, error = "succeeded", None
+        except Exception as e:
+            print(f"[knowledge_index] reindex failed for {project_id}: {e}")
+            result, status, error = None, "failed", str(e)
+        duration_ms = int((time.monotonic() - started) * 1000)
+        _record(project_id, {
+            "job_status": status,
+            "job_finished_at": datetime.utcnow(),
+            "job_duration_ms": duration_ms,
+            "job_error": error,
+            "job_result": result,
+        })
+        with _cond:
+            _running.discard(project_id)
+            _stats[status] += 1
+            _stats["last_duration_ms"] = duration_ms
+            _cond.notify_all()
+
+
+def get_status(project_id) -> dict:
+    project_id = str(project_id)
+    state = knowledge_state_collection.find_one({"_id": project_id}) or {}
+    with _cond:
+        if project_id in _running:
+            state["job_status"] = "running"
+        elif project_id in _pending:
+            state["job_status"] = "queued"
+    state.pop("_id", None)
+    return {"project_id": project_id, **state}
+
+
+def metrics() -> dict:
+    with _cond:
+        return {**_stats, "pending": len(_pending), "running": len(_running), "workers": len(_workers)}
@@ -0,0 +1,39 @@
+from bson import ObjectId
+from extensions import users_collection
+from services import match_feed_store
+from services.matching_service import rank_feed, hydrate_feed
+
+
+def materialize_feed(user: dict, feed_type: str, ranked: list | None = None) -> list:
+    """Store the top of a ranking (computed here unless given) as the user's feed."""
+    if ranked is None:
+        ranked = rank_feed(user, feed_type, match_feed_store.FEED_SIZE)
+    items = hydrate_feed(feed_type, ranked[:match_feed_store.FEED_SIZE])
+    # An empty ranking usually means the user's embedding failed; don't pin it.
+    if items:
+        match_feed_store.save_feed(str(user["_id"]), feed_type, items)
+    return items
+
+
+def refresh_match_feeds(max_feeds=200):
+    due = match_feed_store.claim_due(max_feeds)
+    if not due:
+        return {"feeds_refreshed": 0}
+
+    users = {
+        str(u["_id"]): u
+        for u in users_collection.find({"_id": {"$in": list({ObjectId(uid) for uid, _ in due})}})
+    }
+
+    refreshed = 0
+    for user_id, feed_type in due:
+        user = users.get(user_id)
+        if not user:
+            continue
+        try:
+            materialize_feed(user, feed_type)
+            refreshed += 1
+        except Exception as e:
+            print(f"[match_feeds] refresh failed for {user_id}/{feed_type}: {e}")
+
+    return {"feeds_refreshed": refreshed}
@@ -0,0 +1,19 @@
+from extensions import user_embeddings_collection
+from services import people_index
+from services.matching_service import ANN_MIN_CANDIDATES
+
+ROLES = ("student", "mentor")
+
+
+def maintain_people_indexes():
+    """Build, refresh and publish the HNSW index of every role large enough to use it."""
+    maintained = 0
+    for role in ROLES:
+        if user_embeddings_collection.count_documents({"role": role}) < ANN_MIN_CANDIDATES:
+            continue
+        try:
+            people_index.maintain(role)
+            maintained += 1
+        except Exception as e:
+            print(f"[people_index] maintenance failed for {role}: {e}")
+    return {"roles_maintained": maintained}
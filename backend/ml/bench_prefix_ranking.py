@@ -0,0 +1,106 @@
+"""Benchmark Matryoshka-style prefix pre-ranking against full-dimension ranking.
+
+Reports recall@K of "scan a P-dim prefix, re-score the top K*factor at full
+dimension" versus the exact full-dimension top-K, plus per-query latency.
+
+Queries are held out: they are removed from the corpus before ranking, so a
+query never finds itself among the true top-K.
+
+Run from the backend folder:
+    python ml/bench_prefix_ranking.py                       # stored user embeddings
+    python ml/bench_prefix_ranking.py --source synthetic    # illustrative only
+
+Synthetic vectors get a decaying per-dimension scale, so prefixes carry most
+of the signal by construction; their recall numbers only exercise the code
+path and say nothing about a real model.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int = 7) -> np.ndarray:
+    # Matryoshka-trained models concentrate information in the leading
+    # dimensions; mimic that with a decaying per-dimension scale.
+    rng = np.random.default_rng(seed)
+    scale = np.exp(-np.arange(dim) / (dim / 6)).astype(np.float32)
+    return _normalize(rng.standard_normal((n, dim), dtype=np.float32) * scale)
+
+
+def mongo_embeddings() -> np.ndarray:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from extensions import user_embeddings_collection
+
+    vectors = [doc["embedding"] for doc in user_embeddings_collection.find({}, {"embedding": 1})]
+    dim = max((len(v) for v in vectors), default=0)
+    vectors = [v for v in vectors if len(v) == dim]
+    if not vectors:
+        raise SystemExit("No stored embeddings found.")
+    return _normalize(np.array(vectors, dtype=np.float32))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[0])
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def run(matrix: np.ndarray, queries: np.ndarray, prefix_dims: list, k: int, factor: int):
+    full_ms, exact = [], []
+    for q in queries:
+        start = time.perf_counter()
+        exact.append(set(top_k(matrix @ q, k)))
+        full_ms.append((time.perf_counter() - start) * 1000)
+    print(f"{'full':>8}  dims={matrix.shape[1]:<5} recall@{k}=1.000  "
+          f"p50={np.median(full_ms):.2f}ms  p95={np.percentile(full_ms, 95):.2f}ms")
+
+    for dims in prefix_dims:
+        if dims >= matrix.shape[1]:
+            continue
+        prefix = _normalize(matrix[:, :dims].copy())
+        recalls, latencies = [], []
+        for q, truth in zip(queries, exact):
+            start = time.perf_counter()
+            qp = q[:dims] / (np.linalg.norm(q[:dims]) or 1.0)
+            shortlist = top_k(prefix @ qp, k * factor)
+            rescored = shortlist[top_k(matrix[shortlist] @ q, k)]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(truth & set(rescored)) / len(truth))
+        print(f"{'prefix':>8}  dims={dims:<5} recall@{k}={np.mean(recalls):.3f}  "
+              f"p50={np.median(latencies):.2f}ms  p95={np.percentile(latencies, 95):.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["synthetic", "mongo"], default="mongo")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--prefix", type=int, nargs="+", default=[128, 256, 512, 768])
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    vectors = mongo_embeddings() if args.source == "mongo" else synthetic_embeddings(args.users, args.dim)
+    n_queries = min(args.queries, vectors.shape[0] // 2)
+    rng = np.random.default_rng(11)
+    held_out = np.zeros(vectors.shape[0], dtype=bool)
+    held_out[rng.choice(vectors.shape[0], size=n_queries, replace=False)] = True
+    queries, matrix = vectors[held_out], vectors[~held_out]
+    if args.source == "synthetic":
+        print("NOTE: synthetic vectors favour prefixes by construction; results are illustrative only.")
+    print(f"{matrix.shape[0]} vectors x {matrix.shape[1]} dims, {len(queries)} held-out queries, "
+          f"shortlist={args.k}x{args.rerank_factor}")
+    run(matrix, queries, args.prefix, args.k, args.rerank_factor)
+
+
+if __name__ == "__main__":
+    main()
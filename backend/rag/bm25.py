@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, OrderedDict
+
+# Per-project BM25 inverted index over the same chunks as the FAISS index.
+# Catches exact task titles and assignee names that embeddings blur, and
+# lets keyword-style questions be answered without a query embedding.
+
+K1 = 1.2
+B = 0.75
+CACHE_ENTRIES = int(os.getenv("RAG_LEXICAL_CACHE_ENTRIES", "128"))
+INDEX_DIR = os.path.join(os.path.dirname(__file__), "indexes")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in",
+    "is", "it", "of", "on", "or", "that", "the", "to", "was", "were", "with",
+    "what", "who", "how", "do", "does", "we", "our", "should", "which",
+}
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def keyword_ratio(text: str) -> float:
+    """Share of the query's words that are content terms (not stopwords)."""
+    words = _TOKEN.findall(text.lower())
+    return len(tokenize(text)) / len(words) if words else 0.0
+
+
+def _path(project_id: str):
+    return os.path.join(INDEX_DIR, f"{project_id}_bm25.json")
+
+
+def build(docs: list[dict]) -> dict:
+    """docs: [{"source_type", "source_id", "text"}] in index order."""
+    postings = {}
+    lengths = []
+    for i, doc in enumerate(docs):
+        terms = Counter(tokenize(doc["text"]))
+        lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            postings.setdefault(term, []).append([i, tf])
+    return {
+        "docs": [{"source_type": d["source_type"], "source_id": d["source_id"], "text": d["text"]} for d in docs],
+        "lengths": lengths,
+        "avgdl": (sum(lengths) / len(lengths)) if lengths else 0.0,
+        "postings": postings,
+    }
+
+
+def save(project_id: str, docs: list[dict]):
+    path = _path(project_id)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(build(docs), f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def exists(project_id: str) -> bool:
+    return os.path.exists(_path(project_id))
+
+
+def delete(project_id: str):
+    if os.path.exists(_path(project_id)):
+        os.remove(_path(project_id))
+    with _lock:
+        _cache.pop(str(project_id), None)
+
+
+def load(project_id: str) -> dict | None:
+    path = _path(project_id)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    key = str(project_id)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == mtime:
+            _cache.move_to_end(key)
+            return entry[1]
+    with open(path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    with _lock:
+        _cache[key] = (mtime, index)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return index
+
+
+def search(index: dict, query: str, top_k: int = 5) -> tuple[list, float]:
+    """Return ([(doc_position, score)], coverage) where coverage is the share
+    of query terms found in the best document."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    n = len(index["docs"])
+    if not terms or not n:
+        return [], 0.0
+
+    scores = {}
+    matched = {}
+    for term in terms:
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc, tf in postings:
+            norm = K1 * (1 - B + B * index["lengths"][doc] / (index["avgdl"] or 1.0))
+            scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+            matched[doc] = matched.get(doc, 0) + 1
+
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+    coverage = matched[ranked[0][0]] / len(terms) if ranked else 0.0
+    return ranked, coverage
@@ -1,24 +1,69 @@
 import os
 import json
+import threading
+from collections import OrderedDict
 import faiss
 import numpy as np
+from rag.meta_store import write_metadata, MetadataView
+from rag import bm25, sharded_store, versioned_files
 
 BASE_DIR = os.path.dirname(__file__)
 INDEX_DIR = os.path.join(BASE_DIR, "indexes")
 os.makedirs(INDEX_DIR, exist_ok=True)
 
+# "project": one index file pair per project (default).
+# "sharded": all projects in RAG_INDEX_SHARDS shared shards (rag/sharded_store.py).
+# Each mode also keeps the project's BM25 index: a per-project file next to
+# the FAISS files, or a part of the shard.
+INDEX_MODE = os.getenv("RAG_INDEX_MODE", "project").lower()
+if INDEX_MODE not in ("project", "sharded"):
+    raise ValueError(f"Unsupported RAG_INDEX_MODE: {INDEX_MODE}")
 
-def _index_path(project_id: str):
+# Loaded (index, metadata) pairs per project, LRU-bounded by entry count and
+# approximate memory. Entries are keyed by the project's manifest version
+# (rag/versioned_files.py), so a rebuild by any worker is picked up on the
+# next search and a search always uses an index and metadata from one version.
+CACHE_MAX_ENTRIES = int(os.getenv("RAG_INDEX_CACHE_ENTRIES", "64"))
+CACHE_MAX_BYTES = int(os.getenv("RAG_INDEX_CACHE_MB", "256")) * 1024 * 1024
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_stats = {"hits": 0, "misses": 0, "stale_reloads": 0, "evictions": 0}
+
+
+def _legacy_index_path(project_id: str):
+    # Unversioned files written before manifests; read until the next save.
     return os.path.join(INDEX_DIR, f"{project_id}.index")
 
 
-def _meta_path(project_id: str):
-    return os.path.join(INDEX_DIR, f"{project_id}_meta.json")
+def _legacy_meta_paths(project_id: str):
+    # Binary metadata, then the older pretty-printed JSON.
+    return [
+        os.path.join(INDEX_DIR, f"{project_id}_meta.bin"),
+        os.path.join(INDEX_DIR, f"{project_id}_meta.json"),
+    ]
+
+
+def _legacy_files(project_id: str):
+    index_file = _legacy_index_path(project_id)
+    meta_file = next((p for p in _legacy_meta_paths(project_id) if os.path.exists(p)), None)
+    if not os.path.exists(index_file) or meta_file is None:
+        return None
+    return index_file, meta_file
+
+
+def _remove_legacy_files(project_id: str):
+    for path in [_legacy_index_path(project_id)] + _legacy_meta_paths(project_id):
+        if os.path.exists(path):
+            os.remove(path)
 
 
 def save_project_index(project_id: str, embeddings: list[list[float]], metadata: list[dict]):
     if not embeddings:
         return {"indexed": 0}
+    if INDEX_MODE == "sharded":
+        return sharded_store.save_project(project_id, embeddings, metadata)
 
     vectors = np.array(embeddings, dtype="float32")
     dimension = vectors.shape[1]
@@ -26,31 +71,179 @@ def save_project_index(project_id: str, embeddings: list[list[float]], metadata:
     index = faiss.IndexFlatL2(dimension)
     index.add(vectors)
 
-    faiss.write_index(index, _index_path(project_id))
+    manifest = versioned_files.write_version(
+        INDEX_DIR,
+        str(project_id),
+        {
+            "index": lambda path: faiss.write_index(index, path),
+            "meta.bin": lambda path: write_metadata(path, metadata),
+        },
+        count=len(metadata),
+    )
+    _remove_legacy_files(project_id)
+    bm25.save(project_id, metadata)
 
-    with open(_meta_path(project_id), "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    invalidate_cached_index(project_id)
+    return {"indexed": len(metadata), "version": manifest["version"]}
 
-    return {"indexed": len(metadata)}
 
+def _signature(project_id: str):
+    signature = versioned_files.signature(INDEX_DIR, str(project_id))
+    if signature is not None:
+        return "manifest", signature
+    legacy = _legacy_files(project_id)
+    if legacy is None:
+        return None
+    return ("legacy",) + tuple(os.stat(p).st_mtime_ns for p in legacy)
 
-def load_project_index(project_id: str):
-    index_file = _index_path(project_id)
-    meta_file = _meta_path(project_id)
 
-    if not os.path.exists(index_file) or not os.path.exists(meta_file):
+def _entry_size(index, metadata, mapped: bool) -> int:
+    # Mapped vectors live in the shared page cache, not this worker's heap.
+    size = 0 if mapped else index.ntotal * index.d * 4
+    if isinstance(metadata, MetadataView):
+        return size + metadata.nbytes
+    return size + sum(len(m.get("text", "")) + 64 for m in metadata)
+
+
+def _evict(project_id: str):
+    global _cache_bytes
+    entry = _cache.pop(project_id, None)
+    if entry is not None:
+        _cache_bytes -= entry[3]
+
+
+def invalidate_cached_index(project_id: str):
+    with _cache_lock:
+        _evict(project_id)
+
+
+def get_cached_index(project_id: str):
+    """Return (index, metadata) for a project, reading from disk only when it changed."""
+    global _cache_bytes
+    signature = _signature(project_id)
+    if signature is None:
+        invalidate_cached_index(project_id)
+        return None, []
+
+    with _cache_lock:
+        entry = _cache.get(project_id)
+        if entry is not None and entry[0] == signature:
+            _cache.move_to_end(project_id)
+            _cache_stats["hits"] += 1
+            return entry[1], entry[2]
+        _cache_stats["stale_reloads" if entry is not None else "misses"] += 1
+
+    try:
+        index, metadata, mapped = _load_project_index(project_id)
+    except (FileNotFoundError, RuntimeError):
+        # Pinned version was retired between reading the manifest and opening
+        # its files (faiss.read_index reports that as a RuntimeError); the
+        # retry resolves the newer manifest.
+        index, metadata, mapped = _load_project_index(project_id)
+    if index is None:
         return None, []
 
-    index = faiss.read_index(index_file)
+    size = _entry_size(index, metadata, mapped)
+    with _cache_lock:
+        _evict(project_id)
+        _cache[project_id] = (signature, index, metadata, size)
+        _cache_bytes += size
+        while len(_cache) > 1 and (len(_cache) > CACHE_MAX_ENTRIES or _cache_bytes > CACHE_MAX_BYTES):
+            _evict(next(iter(_cache)))
+            _cache_stats["evictions"] += 1
+    return index, metadata
+
+
+def cache_metrics() -> dict:
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats["entries"] = len(_cache)
+        stats["bytes"] = _cache_bytes
+    lookups = stats["hits"] + stats["misses"] + stats["stale_reloads"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
 
-    with open(meta_file, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
+def has_project_index(project_id: str) -> bool:
+    if INDEX_MODE == "sharded":
+        return sharded_store.has_project(project_id)
+    return versioned_files.read_manifest(INDEX_DIR, str(project_id)) is not None \
+        or _legacy_files(project_id) is not None
 
+
+def has_lexical_index(project_id: str) -> bool:
+    if INDEX_MODE == "sharded":
+        return sharded_store.has_lexical(project_id)
+    return bm25.exists(project_id)
+
+
+def load_lexical_index(project_id: str) -> dict | None:
+    if INDEX_MODE == "sharded":
+        return sharded_store.load_lexical(project_id)
+    return bm25.load(project_id)
+
+
+def delete_project_index(project_id: str):
+    if INDEX_MODE == "sharded":
+        sharded_store.delete_project(project_id)
+        return
+    invalidate_cached_index(project_id)
+    versioned_files.remove_all(INDEX_DIR, str(project_id))
+    _remove_legacy_files(project_id)
+    bm25.delete(project_id)
+
+
+# IO_FLAG_MMAP only maps IVF inverted lists; the codes of a flat index are
+# mapped by IO_FLAG_MMAP_IFC, which needs FAISS >= 1.9.
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+
+
+def _read_index(index_file: str):
+    """Return (index, mapped), mapped being True when the vectors stay on disk."""
+    if _MMAP_FLAG is not None:
+        try:
+            return faiss.read_index(index_file, _MMAP_FLAG), True
+        except RuntimeError:
+            # Index types the mapping reader does not support.
+            pass
+    return faiss.read_index(index_file), False
+
+
+def load_project_index(project_id: str):
+    """Load the index and metadata of one pinned version."""
+    index, metadata, _ = _load_project_index(project_id)
     return index, metadata
 
 
+def _load_project_index(project_id: str):
+    manifest = versioned_files.read_manifest(INDEX_DIR, str(project_id))
+    if manifest is not None:
+        paths = versioned_files.resolve(INDEX_DIR, manifest)
+        index_file, meta_file = paths["index"], paths["meta.bin"]
+    else:
+        legacy = _legacy_files(project_id)
+        if legacy is None:
+            return None, [], False
+        index_file, meta_file = legacy
+
+    index, mapped = _read_index(index_file)
+
+    if meta_file.endswith(".bin"):
+        metadata = MetadataView(meta_file)
+    else:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+
+    if index.ntotal != len(metadata):
+        raise ValueError(f"Index for {project_id} has {index.ntotal} vectors but {len(metadata)} metadata rows")
+    return index, metadata, mapped
+
+
 def search_project_index(project_id: str, query_embedding: list[float], top_k: int = 5):
-    index, metadata = load_project_index(project_id)
+    if INDEX_MODE == "sharded":
+        return sharded_store.search(query_embedding, top_k, project_id=str(project_id))
+
+    index, metadata = get_cached_index(project_id)
     if index is None or not metadata:
         return []
 
@@ -59,7 +252,7 @@ def search_project_index(project_id: str, query_embedding: list[float], top_k: i
 
     results = []
     for rank, idx in enumerate(indices[0]):
-        if idx == -1 or idx >= len(metadata):
+        if idx == -1:
             continue
 
         item = metadata[idx]
@@ -69,3 +262,16 @@ def search_project_index(project_id: str, query_embedding: list[float], top_k: i
         })
 
     return results
+
+
+def search_all_projects(query_embedding: list[float], top_k: int = 5, project_ids: list | None = None):
+    """Cross-project search for discovery; requires RAG_INDEX_MODE=sharded."""
+    if INDEX_MODE != "sharded":
+        raise RuntimeError("Cross-project search requires RAG_INDEX_MODE=sharded")
+    if project_ids is None:
+        return sharded_store.search(query_embedding, top_k)
+    results = []
+    for project_id in project_ids:
+        results.extend(sharded_store.search(query_embedding, top_k, project_id=str(project_id)))
+    results.sort(key=lambda r: r["distance"])
+    return results[:top_k]
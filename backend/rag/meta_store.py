@@ -0,0 +1,77 @@
+import os
+import json
+import mmap
+import struct
+import numpy as np
+
+# Compact chunk metadata: a fixed header, an offset table and a blob of
+# compact JSON records. Readers mmap the file and decode only the records a
+# search actually returns, so workers share page-cache pages instead of each
+# holding a parsed copy of every chunk.
+#
+#   magic (8 bytes) | count (uint64) | offsets (count + 1 x uint64) | blob
+
+MAGIC = b"PHKMETA1"
+_HEADER = struct.Struct("<8sQ")
+
+
+def encode_record(item: dict) -> bytes:
+    return json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_metadata(path: str, metadata: list[dict]):
+    write_records(path, [encode_record(item) for item in metadata])
+
+
+def write_records(path: str, records: list[bytes]):
+    """Write already-encoded records, e.g. raw() rows copied from another file."""
+    offsets = np.zeros(len(records) + 1, dtype="<u8")
+    if records:
+        offsets[1:] = np.cumsum([len(r) for r in records])
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(records)))
+        f.write(offsets.tobytes())
+        for record in records:
+            f.write(record)
+
+
+class MetadataView:
+    """Read-only, list-like view over a metadata file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f"Truncated metadata file: {path}")
+        magic, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a metadata file: {path}")
+        self._count = count
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=count + 1, offset=_HEADER.size)
+        self._blob_start = _HEADER.size + self._offsets.nbytes
+
+    @property
+    def nbytes(self) -> int:
+        # Private memory only; the blob itself lives in the shared page cache.
+        return self._offsets.nbytes
+
+    def __len__(self) -> int:
+        return self._count
+
+    def raw(self, i: int) -> bytes:
+        """Record i as stored, without decoding it."""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        start = self._blob_start + int(self._offsets[i])
+        end = self._blob_start + int(self._offsets[i + 1])
+        return self._mm[start:end]
+
+    def __getitem__(self, i: int) -> dict:
+        return json.loads(self.raw(i).decode("utf-8"))
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
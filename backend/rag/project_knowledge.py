@@ -1,18 +1,26 @@
+import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from bson.objectid import ObjectId
-from extensions import (
-    projects_collection,
-    tasks_collection,
-    users_collection,
-    project_activity_collection,
-    knowledge_chunks_collection
-)
-from utils.embeddings import generate_embedding
-from rag.faiss_store import save_project_index
+from pymongo import ReplaceOne, DeleteMany, ReturnDocument
+from extensions import knowledge_chunks_collection, knowledge_state_collection
+from utils.embeddings import generate_embeddings
+from services.embedding_gateway import EMBEDDING_MODEL, OUTPUT_DIMENSIONALITY, MAX_BATCH_SIZE
+from rag.faiss_store import save_project_index, delete_project_index, has_project_index, has_lexical_index
+from services.project_snapshot import load_project_snapshot
+
+EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", "2"))
+EMBED_RETRIES = int(os.getenv("RAG_EMBED_RETRIES", "2"))
+EMBED_RETRY_BACKOFF_SECONDS = 1.0
+
 
 def build_project_chunks(project_id: str):
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
-    if not project:
+    snapshot = load_project_snapshot(project_id)
+    if not snapshot:
         return []
+    project = snapshot["project"]
 
     chunks = []
 
@@ -23,12 +31,7 @@ def build_project_chunks(project_id: str):
         "text": f"Project title: {project.get('title', '')}. Description: {project.get('description', '')}. Notes: {project.get('notes', '')}"
     })
 
-    tasks = list(tasks_collection.find({
-        "project_id": ObjectId(project_id),
-        "archived": {"$ne": True}
-    }))
-
-    for task in tasks:
+    for task in snapshot["tasks"]:
         chunks.append({
             "project_id": ObjectId(project_id),
             "source_type": "task",
@@ -36,11 +39,7 @@ def build_project_chunks(project_id: str):
             "text": f"Task: {task.get('title', '')}. Description: {task.get('description', '')}. Status: {task.get('status', '')}. Priority: {task.get('priority', '')}. Assignee: {task.get('assignee_name', '')}"
         })
 
-    activity = list(project_activity_collection.find({
-        "project_id": ObjectId(project_id)
-    }).sort("created_at", -1).limit(20))
-
-    for item in activity:
+    for item in snapshot["activity"]:
         chunks.append({
             "project_id": ObjectId(project_id),
             "source_type": "activity",
@@ -48,36 +47,139 @@ def build_project_chunks(project_id: str):
             "text": f"Activity: {item.get('message', '')}. Actor: {item.get('actor_name', '')}. Event type: {item.get('event_type', '')}"
         })
 
-    member_ids = project.get("team_members", [])
-    for member_id in member_ids:
-        user = users_collection.find_one({"_id": member_id})
-        if user:
-            chunks.append({
-                "project_id": ObjectId(project_id),
-                "source_type": "member",
-                "source_id": str(user["_id"]),
-                "text": f"Member: {user.get('name', '')}. Role: {user.get('role', '')}. Skills: {', '.join(user.get('skills', []))}. Interests: {', '.join(user.get('interests', []))}"
-            })
+    for user in snapshot["members"]:
+        chunks.append({
+            "project_id": ObjectId(project_id),
+            "source_type": "member",
+            "source_id": str(user["_id"]),
+            "text": f"Member: {user.get('name', '')}. Role: {user.get('role', '')}. Skills: {', '.join(user.get('skills', []))}. Interests: {', '.join(user.get('interests', []))}"
+        })
 
     return chunks
 
 
+def chunk_key(chunk: dict) -> tuple:
+    return chunk["source_type"], chunk["source_id"]
+
+
+def chunk_hash(text: str) -> str:
+    # Model and dimensionality are part of the hash so a change to either
+    # re-embeds every chunk on the next rebuild.
+    raw = f"{EMBEDDING_MODEL}|{OUTPUT_DIMENSIONALITY or 'full'}|{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_knowledge_version(project_id: str) -> int:
+    state = knowledge_state_collection.find_one({"_id": str(project_id)}, {"version": 1})
+    return state.get("version", 0) if state else 0
+
+
+def _bump_version(project_id: str, chunk_count: int) -> int:
+    state = knowledge_state_collection.find_one_and_update(
+        {"_id": str(project_id)},
+        {"$inc": {"version": 1}, "$set": {"chunk_count": chunk_count, "indexed_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return state["version"]
+
+
+def _embed_batch(texts: list) -> list:
+    for attempt in range(EMBED_RETRIES + 1):
+        try:
+            return generate_embeddings(texts)
+        except Exception as e:
+            if attempt == EMBED_RETRIES:
+                raise
+            print(f"[RAG] embedding batch of {len(texts)} failed (attempt {attempt + 1}): {e}")
+            time.sleep(EMBED_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+def _embed_chunks(chunks: list) -> tuple[dict, int]:
+    """Embed chunk texts in provider-sized batches; returns ({key: embedding}, failed)."""
+    batches = [chunks[i:i + MAX_BATCH_SIZE] for i in range(0, len(chunks), MAX_BATCH_SIZE)]
+    embeddings = {}
+    failed = 0
+    if not batches:
+        return embeddings, failed
+    with ThreadPoolExecutor(max_workers=min(EMBED_WORKERS, len(batches))) as pool:
+        futures = {pool.submit(_embed_batch, [c["text"] for c in batch]): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                print(f"[RAG] giving up on {len(batch)} chunk(s): {e}")
+                failed += len(batch)
+                continue
+            for chunk, vector in zip(batch, vectors):
+                embeddings[chunk_key(chunk)] = vector
+    return embeddings, failed
+
+
 def upsert_project_knowledge(project_id: str):
-    knowledge_chunks_collection.delete_many({"project_id": ObjectId(project_id)})
-    chunks = build_project_chunks(project_id)
+    """Bring a project's chunks and FAISS index up to date, embedding only what changed."""
+    chunks = list({chunk_key(c): c for c in build_project_chunks(project_id)}.values())
+    for chunk in chunks:
+        chunk["content_hash"] = chunk_hash(chunk["text"])
+
+    existing = {
+        chunk_key(doc): doc
+        for doc in knowledge_chunks_collection.find(
+            {"project_id": ObjectId(project_id)},
+            {"source_type": 1, "source_id": 1, "content_hash": 1},
+        )
+    }
+    current_keys = {chunk_key(c) for c in chunks}
+    changed = [c for c in chunks if existing.get(chunk_key(c), {}).get("content_hash") != c["content_hash"]]
+    removed_ids = [doc["_id"] for key, doc in existing.items() if key not in current_keys]
+
+    if not changed and not removed_ids and has_project_index(project_id) \
+            and has_lexical_index(project_id):
+        return {
+            "chunks_indexed": len(chunks),
+            "chunks_embedded": 0,
+            "chunks_removed": 0,
+            "faiss_indexed": len(chunks),
+            "version": get_knowledge_version(project_id),
+        }
+
+    now = datetime.utcnow()
+    writes = []
+    fresh, failed = _embed_chunks(changed)
+    for chunk in changed:
+        embedding = fresh.get(chunk_key(chunk))
+        if embedding is None:
+            continue
+        writes.append(ReplaceOne(
+            {"project_id": chunk["project_id"], "source_type": chunk["source_type"], "source_id": chunk["source_id"]},
+            {**chunk, "embedding": embedding, "updated_at": now},
+            upsert=True,
+        ))
+    if removed_ids:
+        writes.append(DeleteMany({"_id": {"$in": removed_ids}}))
+    if writes:
+        knowledge_chunks_collection.bulk_write(writes, ordered=False)
+
+    # Unchanged chunks keep their stored vectors; only read them when the
+    # index actually has to be rewritten. A chunk whose batch failed keeps its
+    # previous vector (if any) and stays "changed" for the next rebuild.
+    stored = {
+        chunk_key(doc): doc["embedding"]
+        for doc in knowledge_chunks_collection.find(
+            {"project_id": ObjectId(project_id)},
+            {"source_type": 1, "source_id": 1, "embedding": 1},
+        )
+        if chunk_key(doc) in current_keys and chunk_key(doc) not in fresh
+    }
+    stored.update(fresh)
 
-    docs = []
     embeddings = []
     metadata = []
-
     for chunk in chunks:
-        embedding = generate_embedding(chunk["text"])
-
-        docs.append({
-            **chunk,
-            "embedding": embedding
-        })
-
+        embedding = stored.get(chunk_key(chunk))
+        if embedding is None:
+            continue
         embeddings.append(embedding)
         metadata.append({
             "source_type": chunk["source_type"],
@@ -85,12 +187,17 @@ def upsert_project_knowledge(project_id: str):
             "text": chunk["text"]
         })
 
-    if docs:
-        knowledge_chunks_collection.insert_many(docs)
-
-    faiss_result = save_project_index(project_id, embeddings, metadata)
+    if embeddings:
+        faiss_result = save_project_index(project_id, embeddings, metadata)
+    else:
+        delete_project_index(project_id)
+        faiss_result = {"indexed": 0}
 
     return {
-        "chunks_indexed": len(docs),
-        "faiss_indexed": faiss_result["indexed"]
+        "chunks_indexed": len(metadata),
+        "chunks_embedded": len(fresh),
+        "chunks_removed": len(removed_ids),
+        "chunks_failed": failed,
+        "faiss_indexed": faiss_result["indexed"],
+        "version": _bump_version(project_id, len(metadata)),
     }
@@ -1,13 +1,122 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
 from utils.embeddings import generate_embedding
-from rag.faiss_store import search_project_index
+from rag.faiss_store import search_project_index, search_all_projects, load_lexical_index
+from rag import bm25
+
+# Copilot questions repeat a lot ("what should we do next?"), across projects.
+# Query embeddings are cached here, keyed by normalised text with a TTL, in
+# front of the shared embedding cache (services/embedding_cache.py). That one
+# is keyed by exact text and hashes it with sha256, may cost a Mongo round
+# trip, and is churned by chunk re-indexing. This one answers a repeat, even
+# with different case or a trailing "?", from memory. On a miss the
+# question's original text is embedded; the normalised form is only a key.
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("RAG_QUERY_CACHE_TTL_SECONDS", "3600"))
+
+# Hybrid retrieval: BM25 and vector hits are fused with reciprocal rank
+# fusion. For keyword-style queries (mostly content words) whose best lexical
+# hit contains every term and clearly beats the runner-up, the query
+# embedding is skipped altogether.
+CANDIDATE_FACTOR = 4
+RRF_K = 60
+LEXICAL_SKIP_MARGIN = float(os.getenv("RAG_LEXICAL_SKIP_MARGIN", "2.0"))
+LEXICAL_SKIP_KEYWORD_RATIO = 0.5
+
+_query_lock = threading.Lock()
+_query_cache = OrderedDict()
+_query_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"[\s?!.]+$", "", " ".join(query.lower().split()))
+
+
+def embed_query(query: str) -> list:
+    key = normalize_query(query) or query
+    with _query_lock:
+        entry = _query_cache.get(key)
+        if entry is not None:
+            expires_at, embedding = entry
+            if expires_at >= time.monotonic():
+                _query_cache.move_to_end(key)
+                _query_stats["hits"] += 1
+                return embedding
+            del _query_cache[key]
+            _query_stats["expired"] += 1
+        _query_stats["misses"] += 1
+
+    embedding = generate_embedding(query)
+    with _query_lock:
+        _query_cache[key] = (time.monotonic() + QUERY_CACHE_TTL_SECONDS, embedding)
+        _query_cache.move_to_end(key)
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+            _query_stats["evictions"] += 1
+    return embedding
+
+
+def query_cache_metrics() -> dict:
+    with _query_lock:
+        stats = dict(_query_stats)
+        stats["entries"] = len(_query_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def _lexically_confident(query: str, lexical: list, coverage: float) -> bool:
+    if not lexical or coverage < 1.0 or bm25.keyword_ratio(query) < LEXICAL_SKIP_KEYWORD_RATIO:
+        return False
+    return len(lexical) == 1 or lexical[0][1] >= LEXICAL_SKIP_MARGIN * lexical[1][1]
+
+
+def _fuse(ranked_lists: list, top_k: int) -> list:
+    fused = {}
+    for ranked in ranked_lists:
+        for rank, item in enumerate(ranked):
+            key = (item.get("source_type", ""), item.get("source_id", item.get("text", "")))
+            entry = fused.setdefault(key, {"item": item, "score": 0.0})
+            entry["score"] += 1.0 / (RRF_K + rank + 1)
+    best = sorted(fused.values(), key=lambda e: e["score"], reverse=True)[:top_k]
+    return [(e["item"], e["score"]) for e in best]
 
 
 def retrieve_project_context(project_id: str, query: str, top_k: int = 5):
-    query_embedding = generate_embedding(query)
-    results = search_project_index(project_id, query_embedding, top_k=top_k)
+    lexical_index = load_lexical_index(project_id)
+    lexical, coverage = ([], 0.0)
+    if lexical_index is not None:
+        lexical, coverage = bm25.search(lexical_index, query, top_k * CANDIDATE_FACTOR)
+    lexical_items = [lexical_index["docs"][doc] for doc, _ in lexical] if lexical else []
+
+    if _lexically_confident(query, lexical, coverage):
+        results = _fuse([lexical_items], top_k)
+    else:
+        query_embedding = embed_query(query)
+        vector_items = search_project_index(project_id, query_embedding, top_k=top_k * CANDIDATE_FACTOR)
+        results = _fuse([vector_items, lexical_items], top_k)
+
+    return [
+        {
+            "source_type": item.get("source_type", ""),
+            "text": item.get("text", ""),
+            "score": round(score, 6)
+        }
+        for item, score in results
+    ]
+
+
+def retrieve_cross_project_context(query: str, top_k: int = 5, project_ids: list | None = None):
+    """Discovery search across projects' knowledge (sharded index mode only)."""
+    query_embedding = embed_query(query)
+    results = search_all_projects(query_embedding, top_k=top_k, project_ids=project_ids)
 
     return [
         {
+            "project_id": item.get("project_id", ""),
             "source_type": item.get("source_type", ""),
             "text": item.get("text", ""),
             "score": item.get("distance", 0.0)
@@ -0,0 +1,290 @@
+import os
+import json
+import zlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from rag.meta_store import encode_record, write_records, MetadataView
+from rag import bm25, versioned_files
+
+# Knowledge vectors for all projects in a few large shards instead of one
+# index pair per project. A project always lives in shard crc32(id) % N; each
+# vector's FAISS id maps to a metadata record carrying its project_id, and a
+# search is scoped to one project with an IDSelectorBatch over that project's
+# ids (or searches every shard for cross-project discovery).
+#
+# A shard version is four files published together: the index, its metadata
+# records in label order (memory-mapped, decoded only for hits), one BM25
+# index per project (same format, decoded on demand) and a small
+# project -> labels map. Loaded shards are never modified: a write builds the
+# next version from a clone and swaps it in, so searches never wait on a save.
+# Rows of the projects a write does not touch are copied as stored bytes;
+# only the changed project is encoded.
+
+SHARD_COUNT = int(os.getenv("RAG_INDEX_SHARDS", "8"))
+SHARD_DIR = os.path.join(os.path.dirname(__file__), "indexes", "shards")
+os.makedirs(SHARD_DIR, exist_ok=True)
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, thread lock only
+    fcntl = None
+
+_lock = threading.Lock()
+_shards = {}
+_write_locks = [threading.Lock() for _ in range(SHARD_COUNT)]
+_lexical_cache = OrderedDict()
+
+
+def shard_for(project_id: str) -> int:
+    return zlib.crc32(str(project_id).encode("utf-8")) % SHARD_COUNT
+
+
+def _stem(shard_id: int):
+    return f"shard_{shard_id}"
+
+
+@contextmanager
+def _write_lock(shard_id: int):
+    """Serialise shard writes across worker processes as well as threads."""
+    with _write_locks[shard_id]:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(SHARD_DIR, f"shard_{shard_id}.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _selector(labels: list):
+    return faiss.IDSelectorBatch(len(labels), faiss.swig_ptr(np.array(labels, dtype="int64")))
+
+
+def _write_json(path: str, data: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+class _Shard:
+    def __init__(self, shard_id: int, index=None, records=None, lexical=None, projects=None, signature=None):
+        self.shard_id = shard_id
+        self.index = index
+        self.records = records      # MetadataView in label order
+        self.lexical = lexical      # MetadataView, one BM25 index per project
+        self.projects = projects or {}  # project_id -> {"labels": [...], "lexical_row": n}
+        self.labels = np.array(
+            sorted(label for entry in self.projects.values() for label in entry["labels"]), dtype="int64"
+        )
+        self.next_label = int(self.labels[-1]) + 1 if len(self.labels) else 0
+        self.signature = signature
+
+    def _row(self, label: int) -> int | None:
+        row = int(np.searchsorted(self.labels, label))
+        if row == len(self.labels) or self.labels[row] != label:
+            return None
+        return row
+
+    def record(self, label: int) -> dict | None:
+        row = self._row(label)
+        return None if row is None else self.records[row]
+
+    def raw_record(self, label: int) -> bytes:
+        return self.records.raw(self._row(label))
+
+    def raw_lexical(self, project_id: str) -> bytes:
+        entry = self.projects[project_id]
+        if self.lexical is None or entry.get("lexical_row") is None:
+            # Shard saved before BM25 parts: build it once from the records.
+            return encode_record(bm25.build([self.record(label) for label in entry["labels"]]))
+        return self.lexical.raw(entry["lexical_row"])
+
+    def lexical_index(self, project_id: str) -> dict | None:
+        entry = self.projects.get(project_id)
+        if entry is None or self.lexical is None or entry.get("lexical_row") is None:
+            return None
+        return self.lexical[entry["lexical_row"]]
+
+    def search(self, query: np.ndarray, top_k: int, project_id: str | None = None) -> list:
+        if self.index is None or self.index.ntotal == 0:
+            return []
+        if project_id is None:
+            k = min(top_k, self.index.ntotal)
+            distances, labels = self.index.search(query, k)
+        else:
+            labels = self.projects.get(project_id, {}).get("labels")
+            if not labels:
+                return []
+            k = min(top_k, len(labels))
+            try:
+                params = faiss.SearchParameters()
+                params.sel = _selector(labels)
+                distances, labels = self.index.search(query, k, params=params)
+            except (AttributeError, TypeError, RuntimeError):
+                # FAISS without search-time selectors: over-fetch and post-filter.
+                fetch = min(self.index.ntotal, max(k * 8, 64))
+                distances, labels = self.index.search(query, fetch)
+        results = []
+        for distance, label in zip(distances[0], labels[0]):
+            if label < 0:
+                continue
+            record = self.record(int(label))
+            if record is None or (project_id is not None and record["project_id"] != project_id):
+                continue
+            results.append({**record, "distance": float(distance)})
+            if len(results) == top_k:
+                break
+        return results
+
+
+def _signature(shard_id: int):
+    return versioned_files.signature(SHARD_DIR, _stem(shard_id))
+
+
+def _load(shard_id: int) -> _Shard:
+    signature = _signature(shard_id)
+    manifest = versioned_files.read_manifest(SHARD_DIR, _stem(shard_id))
+    if manifest is None:
+        return _Shard(shard_id)
+    # Every part comes from the same manifest version.
+    paths = versioned_files.resolve(SHARD_DIR, manifest)
+    index = faiss.read_index(paths["index"])
+    records = MetadataView(paths["meta.bin"])
+    if "projects.json" in paths:
+        with open(paths["projects.json"], "r", encoding="utf-8") as f:
+            projects = json.load(f)
+        lexical = MetadataView(paths["lexical.bin"])
+    else:
+        # Shards saved before the project map: derive it once; the next
+        # write adds the missing parts.
+        projects, lexical = {}, None
+        for record in records:
+            projects.setdefault(record["project_id"], {"labels": []})["labels"].append(record["label"])
+    return _Shard(shard_id, index, records, lexical, projects, signature)
+
+
+def _get(shard_id: int) -> _Shard:
+    """Return a shard, reloading it if another worker rewrote it."""
+    signature = _signature(shard_id)
+    with _lock:
+        shard = _shards.get(shard_id)
+    if shard is not None and shard.signature == signature:
+        return shard
+    shard = _load(shard_id)
+    with _lock:
+        _shards[shard_id] = shard
+    return shard
+
+
+def _publish(shard: _Shard, project_id: str, vectors: np.ndarray | None = None, metadata: list | None = None):
+    """Write the next version of a shard with one project replaced or removed,
+    then swap it in. Runs under _write_lock(shard.shard_id)."""
+    index = faiss.clone_index(shard.index) if shard.index is not None else None
+    old_labels = shard.projects.get(project_id, {}).get("labels")
+    if old_labels and index is not None:
+        index.remove_ids(_selector(old_labels))
+
+    labels = {pid: entry["labels"] for pid, entry in shard.projects.items() if pid != project_id}
+    added = {}
+    if metadata:
+        if index is None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+        if index.d != vectors.shape[1]:
+            raise ValueError(f"Shard {shard.shard_id} holds {index.d}-dim vectors, got {vectors.shape[1]}")
+        new_labels = np.arange(shard.next_label, shard.next_label + len(metadata), dtype="int64")
+        index.add_with_ids(vectors, new_labels)
+        added = {
+            label: {**item, "project_id": project_id, "label": label}
+            for label, item in zip(new_labels.tolist(), metadata)
+        }
+        labels[project_id] = new_labels.tolist()
+
+    records = [
+        encode_record(added[label]) if label in added else shard.raw_record(label)
+        for label in sorted(label for project_labels in labels.values() for label in project_labels)
+    ]
+    order = sorted(labels)
+    lexical = [
+        encode_record(bm25.build(metadata)) if pid == project_id else shard.raw_lexical(pid)
+        for pid in order
+    ]
+    projects = {pid: {"labels": labels[pid], "lexical_row": row} for row, pid in enumerate(order)}
+
+    manifest = versioned_files.write_version(SHARD_DIR, _stem(shard.shard_id), {
+        "index": lambda path: faiss.write_index(index, path),
+        "meta.bin": lambda path: write_records(path, records),
+        "lexical.bin": lambda path: write_records(path, lexical),
+        "projects.json": lambda path: _write_json(path, projects),
+    }, count=len(records))
+    paths = versioned_files.resolve(SHARD_DIR, manifest)
+    published = _Shard(
+        shard.shard_id, index, MetadataView(paths["meta.bin"]), MetadataView(paths["lexical.bin"]),
+        projects, _signature(shard.shard_id),
+    )
+    with _lock:
+        _shards[shard.shard_id] = published
+
+
+def save_project(project_id: str, embeddings: list[list[float]], metadata: list[dict]):
+    project_id = str(project_id)
+    vectors = np.array(embeddings, dtype="float32").reshape(len(embeddings), -1)
+    shard_id = shard_for(project_id)
+    with _write_lock(shard_id):
+        _publish(_get(shard_id), project_id, vectors, metadata)
+    return {"indexed": len(metadata)}
+
+
+def delete_project(project_id: str):
+    project_id = str(project_id)
+    shard_id = shard_for(project_id)
+    with _write_lock(shard_id):
+        shard = _get(shard_id)
+        if project_id in shard.projects:
+            _publish(shard, project_id)
+
+
+def has_project(project_id: str) -> bool:
+    return str(project_id) in _get(shard_for(project_id)).projects
+
+
+def has_lexical(project_id: str) -> bool:
+    project_id = str(project_id)
+    return _get(shard_for(project_id)).projects.get(project_id, {}).get("lexical_row") is not None
+
+
+def load_lexical(project_id: str) -> dict | None:
+    """The project's BM25 index (rag/bm25.py format), or None."""
+    project_id = str(project_id)
+    shard = _get(shard_for(project_id))
+    key = (project_id, shard.signature)
+    with _lock:
+        index = _lexical_cache.get(key)
+        if index is not None:
+            _lexical_cache.move_to_end(key)
+            return index
+    index = shard.lexical_index(project_id)
+    if index is not None:
+        with _lock:
+            _lexical_cache[key] = index
+            while len(_lexical_cache) > bm25.CACHE_ENTRIES:
+                _lexical_cache.popitem(last=False)
+    return index
+
+
+def search(query_embedding: list[float], top_k: int = 5, project_id: str | None = None) -> list:
+    """Search one project's knowledge, or every project when project_id is None."""
+    query = np.array([query_embedding], dtype="float32")
+    if project_id is not None:
+        return _get(shard_for(project_id)).search(query, top_k, str(project_id))
+
+    results = []
+    for shard_id in range(SHARD_COUNT):
+        shard = _get(shard_id)
+        if shard.index is not None and shard.index.d == query.shape[1]:
+            results.extend(shard.search(query, top_k))
+    results.sort(key=lambda r: r["distance"])
+    return results[:top_k]
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process
+    fcntl = None
+
+# Atomic, versioned groups of files (a FAISS index plus its metadata).
+# Every save writes a new, never-modified file per part, e.g.
+# "{stem}.v{version}.index", and then atomically replaces "{stem}_manifest.json"
+# to point at them. A reader resolves the manifest once and opens exactly the
+# files it names, so it can never pair a new index with old metadata. Older
+# versions are kept briefly for readers that pinned them before the switch.
+# Writers of one stem are serialised with a lock file, so two workers saving
+# at once cannot both extend the same previous manifest and orphan each
+# other's files.
+
+KEEP_VERSIONS = int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "2"))
+
+
+def manifest_path(directory: str, stem: str) -> str:
+    return os.path.join(directory, f"{stem}_manifest.json")
+
+
+def part_path(directory: str, stem: str, version: int, part: str) -> str:
+    return os.path.join(directory, f"{stem}.v{version}.{part}")
+
+
+def _lock_path(directory: str, stem: str) -> str:
+    return os.path.join(directory, f"{stem}_manifest.lock")
+
+
+@contextmanager
+def _manifest_lock(directory: str, stem: str, unlink: bool = False):
+    """Hold the stem's lock file; with unlink=True it is removed on release.
+
+    A waiter that acquires a lock file someone unlinked in the meantime
+    reopens the path, so two holders never end up on different files.
+    """
+    if fcntl is None:
+        yield
+        return
+    path = _lock_path(directory, stem)
+    while True:
+        f = open(path, "a")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        f.close()
+    try:
+        yield
+    finally:
+        if unlink:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def _atomic_write(path: str, write):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def read_manifest(directory: str, stem: str) -> dict | None:
+    try:
+        with open(manifest_path(directory, stem), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def signature(directory: str, stem: str):
+    """Cheap change detector: the manifest's mtime, or None if there is none."""
+    try:
+        return os.stat(manifest_path(directory, stem)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def resolve(directory: str, manifest: dict) -> dict:
+    """{part: absolute path} for a manifest's version."""
+    return {part: os.path.join(directory, name) for part, name in manifest["parts"].items()}
+
+
+def write_version(directory: str, stem: str, writers: dict, **info) -> dict:
+    """Write each part with writers[part](path), then publish them together."""
+    with _manifest_lock(directory, stem):
+        previous = read_manifest(directory, stem)
+        # Nanosecond timestamps keep versions unique across worker processes.
+        version = max(time.time_ns(), (previous or {}).get("version", 0) + 1)
+        parts = {}
+        for part, write in writers.items():
+            path = part_path(directory, stem, version, part)
+            _atomic_write(path, write)
+            parts[part] = os.path.basename(path)
+
+        manifest = {"version": version, "parts": parts, "history": [], **info}
+        if previous:
+            manifest["history"] = ([previous["parts"]] + previous.get("history", []))[:KEEP_VERSIONS]
+            for retired in ([previous["parts"]] + previous.get("history", []))[KEEP_VERSIONS:]:
+                _remove_parts(directory, retired)
+        _atomic_write(manifest_path(directory, stem), lambda path: _write_json(path, manifest))
+        return manifest
+
+
+def _write_json(path: str, data: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def _remove_parts(directory: str, parts: dict):
+    for name in parts.values():
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            # Already gone, or still open on a platform that forbids unlinking.
+            pass
+
+
+def remove_all(directory: str, stem: str):
+    with _manifest_lock(directory, stem, unlink=True):
+        manifest = read_manifest(directory, stem)
+        if manifest is None:
+            return
+        try:
+            os.remove(manifest_path(directory, stem))
+        except FileNotFoundError:
+            pass
+        for parts in [manifest["parts"]] + manifest.get("history", []):
+            _remove_parts(directory, parts)
@@ -1,16 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from bson.objectid import ObjectId
-from extensions import (
-    gemini_client,
-    users_collection,
-    project_activity_collection,
-    projects_collection,
-    tasks_collection,
-)
+from extensions import gemini_client
 import json
-from rag.project_knowledge import upsert_project_knowledge
-from rag.retriever import retrieve_project_context
+from jobs.knowledge_index import enqueue_reindex, get_status as knowledge_index_status, metrics as knowledge_index_metrics
+from rag.retriever import retrieve_project_context, query_cache_metrics
+from rag.faiss_store import has_project_index, cache_metrics as rag_index_cache_metrics
+from services import embedding_cache, embedding_gateway
+from services.project_snapshot import load_project_snapshot
 
 
 ai_bp = Blueprint("ai", __name__)
@@ -107,29 +103,20 @@ def _serialize_copilot_activity(activity):
 
 
 def _build_project_context(project_id):
-    project = projects_collection.find_one({"_id": ObjectId(project_id)})
-    if not project:
+    snapshot = load_project_snapshot(project_id)
+    if not snapshot:
         return None
-
-    tasks = list(tasks_collection.find({
-        "project_id": ObjectId(project_id),
-        "archived": {"$ne": True}
-    }))
-
-    members = []
-    for member_id in project.get("team_members", []):
-        user = users_collection.find_one({"_id": member_id})
-        if user:
-            members.append({
-                "name": user.get("name", ""),
-                "role": user.get("role", ""),
-                "skills": user.get("skills", []),
-                "interests": user.get("interests", [])
-            })
-
-    activity = list(project_activity_collection.find({
-        "project_id": ObjectId(project_id)
-    }).sort("created_at", -1).limit(10))
+    project = snapshot["project"]
+
+    members = [
+        {
+            "name": user.get("name", ""),
+            "role": user.get("role", ""),
+            "skills": user.get("skills", []),
+            "interests": user.get("interests", [])
+        }
+        for user in snapshot["members"]
+    ]
 
     return {
         "title": project.get("title", ""),
@@ -139,9 +126,9 @@ def _build_project_context(project_id):
         "workspace_status": project.get("workspace_status", "active"),
         "workspace_priority": project.get("workspace_priority", "medium"),
         "notes": project.get("notes", ""),
-        "tasks": [_serialize_copilot_task(task) for task in tasks],
+        "tasks": [_serialize_copilot_task(task) for task in snapshot["tasks"]],
         "members": members,
-        "recent_activity": [_serialize_copilot_activity(item) for item in activity]
+        "recent_activity": [_serialize_copilot_activity(item) for item in snapshot["activity"][:10]]
     }
 
 
@@ -294,25 +281,30 @@ def project_rag_copilot():
     if not project_id or not query:
         return jsonify({"error": "project_id and query are required"}), 400
 
-    try:
-        upsert_project_knowledge(project_id)
-    except Exception as e:
-        print(f"[RAG] upsert_project_knowledge failed: {e}")
-        import traceback; traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
-
-    try:
-        retrieved = retrieve_project_context(project_id, query, top_k=5)
-    except Exception as e:
-        print(f"[RAG] retrieve_project_context failed: {e}")
-        import traceback; traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+    # Knowledge is indexed by the background queue; never rebuild on the
+    # request thread. Until the first index exists, answer from a snapshot.
+    index_ready = has_project_index(project_id)
+    if index_ready:
+        try:
+            retrieved = retrieve_project_context(project_id, query, top_k=5)
+        except Exception as e:
+            print(f"[RAG] retrieve_project_context failed: {e}")
+            import traceback; traceback.print_exc()
+            return jsonify({"error": str(e)}), 500
+        context_block = f"Retrieved Context: {json.dumps(retrieved, indent=2)}"
+    else:
+        enqueue_reindex(project_id, debounce=0)
+        context = _build_project_context(project_id)
+        if not context:
+            return jsonify({"error": "Project not found"}), 404
+        retrieved = []
+        context_block = f"Project Context: {json.dumps(context, indent=2)}"
 
     prompt = f"""You are a project copilot. Answer the user's question using the retrieved project context below.
 
 User Question: {query}
 
-Retrieved Context: {json.dumps(retrieved, indent=2)}
+{context_block}
 
 Return a helpful, specific answer grounded in this project data.
 """
@@ -323,8 +315,33 @@ Return a helpful, specific answer grounded in this project data.
       messages=[{"role": "user", "content": prompt}]
       )
       content = response.choices[0].message.content.strip()
-      return jsonify({"answer": content, "retrieved_context": retrieved})
+      return jsonify({"answer": content, "retrieved_context": retrieved, "index_ready": index_ready})
     except Exception as e:
         print(f"[RAG] generate_content failed: {e}")
         import traceback; traceback.print_exc()
-        return jsonify({"answer": "AI copilot could not generate a response right now.", "retrieved_context": retrieved, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"answer": "AI copilot could not generate a response right now.", "retrieved_context": retrieved, "error": str(e)}), 500
+
+
+@ai_bp.route("/embeddings/metrics", methods=["GET"])
+@jwt_required()
+def embedding_metrics():
+    return jsonify({
+        "gateway": embedding_gateway.metrics(),
+        "cache": embedding_cache.metrics(),
+    })
+
+
+@ai_bp.route("/rag/metrics", methods=["GET"])
+@jwt_required()
+def rag_metrics():
+    return jsonify({
+        "index_cache": rag_index_cache_metrics(),
+        "query_cache": query_cache_metrics(),
+        "index_jobs": knowledge_index_metrics(),
+    })
+
+
+@ai_bp.route("/rag/index-status/<project_id>", methods=["GET"])
+@jwt_required()
+def rag_index_status(project_id):
+    return jsonify(knowledge_index_status(project_id))
@@ -7,9 +7,11 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token
 import bcrypt
+from pymongo.errors import DuplicateKeyError
 
 from config import GOOGLE_CLIENT_ID
 from extensions import users_collection
+from utils.emails import normalize_email
 
 auth_bp = Blueprint("auth", __name__)
 @auth_bp.route("/register", methods=["POST"])
@@ -19,7 +21,7 @@ def register():
     email = data["email"]
     password = data["password"]
 
-    if users_collection.find_one({"email": email}):
+    if users_collection.find_one({"$or": [{"email": email}, {"email_normalized": normalize_email(email)}]}):
         return jsonify({"error": "User exists"}), 400
 
     hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
@@ -28,6 +30,7 @@ def register():
     user_doc = {
         "name": data.get("name", ""),
         "email": email,
+        "email_normalized": normalize_email(email),
         "password": hashed,
         "role": normalized_role,
         "skills": data.get("skills", []),
@@ -35,10 +38,14 @@ def register():
         "lookingFor": data.get("lookingFor", []),
         "bio": data.get("bio", ""),
         "tags": data.get("skills", []) + data.get("interests", []),
+        "embedding_pending": True,
         "created_at": datetime.utcnow()
     }
 
-    user_id = users_collection.insert_one(user_doc).inserted_id
+    try:
+        user_id = users_collection.insert_one(user_doc).inserted_id
+    except DuplicateKeyError:
+        return jsonify({"error": "User exists"}), 400
 
     token = create_access_token(identity=str(user_id))
 
@@ -85,12 +92,14 @@ def google_login():
     if not email:
         return jsonify({"error": "Google token did not include an email"}), 400
 
-    user = users_collection.find_one({"email": email})
+    user = users_collection.find_one({"email": email}) \
+        or users_collection.find_one({"email_normalized": normalize_email(email)})
     if not user:
         hashed = bcrypt.hashpw("".encode(), bcrypt.gensalt())
         user_doc = {
             "name": payload.get("name", email.split("@")[0]),
             "email": email,
+            "email_normalized": normalize_email(email),
             "password": hashed,
             "role": "student",
             "skills": [],
@@ -99,10 +108,15 @@ def google_login():
             "bio": "",
             "google_id": payload.get("sub"),
             "tags": [],
+            "embedding_pending": True,
             "created_at": datetime.utcnow()
         }
-        user_id = users_collection.insert_one(user_doc).inserted_id
-        user = users_collection.find_one({"_id": user_id})
+        try:
+            user_id = users_collection.insert_one(user_doc).inserted_id
+            user = users_collection.find_one({"_id": user_id})
+        except DuplicateKeyError:
+            # Another request created the account first.
+            user = users_collection.find_one({"email_normalized": normalize_email(email)})
 
     token = create_access_token(identity=str(user["_id"]))
     return jsonify({
@@ -117,7 +131,8 @@ def google_login():
 @auth_bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json()
-    user = users_collection.find_one({"email": data["email"]})
+    user = users_collection.find_one({"email": data["email"]}) \
+        or users_collection.find_one({"email_normalized": normalize_email(data["email"])})
 
     if not user or not bcrypt.checkpw(
         data["password"].encode(), user["password"]
@@ -5,14 +5,65 @@ from extensions import (
     users_collection,
     notifications_collection,
     match_interests_collection,
+    socketio,
 )
 from datetime import datetime
 from services.embedding_service import upsert_user_embedding
-from services.matching_service import get_ranked_feed
-from services.ai_explanation_service import get_match_explanation
+from services.ai_explanation_service import get_cached_explanations, stream_match_explanations
+from services.matching_service import rank_feed, hydrate_feed
+from services import feed_cursor, match_feed_store
+from jobs.match_feeds import materialize_feed
+
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 50
 
 matchmaking_bp = Blueprint("matchmaking", __name__)
 
+_MATCH_SUMMARY_FIELDS = {"name": 1, "role": 1, "bio": 1, "skills": 1, "interests": 1}
+
+
+def _load_feed_page(current_user: dict, feed_type: str, cursor: tuple | None, limit: int):
+    """Return (items, next_cursor) for the page that follows cursor."""
+    user_id = str(current_user["_id"])
+
+    # Pages that sit entirely inside the materialised feed need no ranking at all.
+    materialized = match_feed_store.get_feed(user_id, feed_type)
+    if materialized is not None:
+        start = feed_cursor.position_after([(i["score"], i["id"]) for i in materialized], cursor)
+        if start + limit < len(materialized):
+            page = materialized[start:start + limit]
+            return page, feed_cursor.encode_cursor(page[-1]["score"], page[-1]["id"])
+
+    ranked = feed_cursor.get_ranking(user_id, feed_type)
+    if ranked is None:
+        ranked = rank_feed(current_user, feed_type, feed_cursor.RANKING_DEPTH)
+        feed_cursor.put_ranking(user_id, feed_type, ranked)
+        if materialized is None:
+            materialize_feed(current_user, feed_type, ranked)
+
+    start = feed_cursor.position_after(ranked, cursor)
+    window = ranked[start:start + limit]
+    next_cursor = feed_cursor.encode_cursor(*window[-1]) if window and start + limit < len(ranked) else None
+    return hydrate_feed(feed_type, window), next_cursor
+
+
+def _push_explanations(current_user: dict, feed_type: str, candidate_ids: list):
+    user_id = str(current_user["_id"])
+    candidates = list(users_collection.find({"_id": {"$in": [ObjectId(cid) for cid in candidate_ids]}}))
+
+    def emit(candidate_id, explanation):
+        # Personal room joined by the client's "register" event.
+        socketio.emit(
+            "match_explanation",
+            {"feed_type": feed_type, "id": candidate_id, "ai_explanation": explanation},
+            room=user_id,
+        )
+
+    try:
+        stream_match_explanations(current_user, candidates, emit)
+    except Exception as e:
+        print(f"[matchmaking] explanation push failed: {e}")
+
 
 @matchmaking_bp.route("/feed", methods=["GET"])
 @jwt_required()
@@ -20,25 +71,32 @@ def get_feed():
     user_id = get_jwt_identity()
     feed_type = request.args.get("type", "teammates")
 
+    try:
+        cursor = feed_cursor.decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    except ValueError as e:
+        return jsonify({"error": str(e), "feed": []}), 400
+    limit = max(1, min(request.args.get("limit", FEED_PAGE_SIZE, type=int), MAX_FEED_PAGE_SIZE))
+
     current_user = users_collection.find_one({"_id": ObjectId(user_id)})
     if not current_user:
         return jsonify({"error": "User not found"}), 404
 
     try:
-        feed = get_ranked_feed(current_user, feed_type)
+        feed, next_cursor = _load_feed_page(current_user, feed_type, cursor, limit)
 
-        # Attach AI explanations to top 5 user/mentor matches
-        if feed_type in ("teammates", "mentors"):
-            for item in feed[:5]:
-                try:
-                    candidate = users_collection.find_one({"_id": ObjectId(item["id"])})
-                    if candidate:
-                        item["ai_explanation"] = get_match_explanation(current_user, candidate)
-                except Exception as e:
-                    print(f"[matchmaking] explanation failed for {item['id']}: {e}")
-                    item["ai_explanation"] = None
-
-        return jsonify({"feed": feed})
+        # Attach cached AI explanations to the top 5 user/mentor matches now;
+        # the rest are generated in the background and pushed over Socket.IO.
+        pending = []
+        if feed_type in ("teammates", "mentors") and feed:
+            top = feed[:5]
+            explanations = get_cached_explanations(current_user, [i["id"] for i in top])
+            for item in top:
+                item["ai_explanation"] = explanations.get(item["id"])
+            pending = [i["id"] for i in top if i["ai_explanation"] is None]
+            if pending:
+                socketio.start_background_task(_push_explanations, current_user, feed_type, pending)
+
+        return jsonify({"feed": feed, "next_cursor": next_cursor, "explanations_pending": pending})
     except Exception as e:
         print(f"[matchmaking] feed error: {e}")
         return jsonify({"error": str(e), "feed": []}), 500
@@ -68,6 +126,8 @@ def express_interest():
         }},
         upsert=True,
     )
+    match_feed_store.remove_item(user_id, target_id)
+    feed_cursor.discard_item(user_id, target_id)
 
     is_mutual = False
 
@@ -122,52 +182,62 @@ def express_interest():
 @jwt_required()
 def get_mutual_matches():
     user_id = get_jwt_identity()
-    seen_ids = set()
-    matches = []
 
-    def add_match(uid):
-        if uid in seen_ids:
-            return
-        try:
-            u = users_collection.find_one({"_id": ObjectId(uid)})
-            if u:
-                seen_ids.add(uid)
-                matches.append({
-                    "id": str(u["_id"]),
-                    "name": u.get("name", ""),
-                    "role": u.get("role", ""),
-                    "bio": u.get("bio", ""),
-                    "skills": u.get("skills", []),
-                    "interests": u.get("interests", []),
-                })
-        except Exception:
-            pass
-
-    # Source 1: Match tab swipes (match_interests collection)
-    my_likes = set(
-        doc["target_id"]
-        for doc in match_interests_collection.find({
-            "user_id": ObjectId(user_id),
-            "action": "like",
-            "target_type": {"$in": ["user", "mentor"]},
-        })
-    )
-    for liked_id in my_likes:
-        try:
-            if match_interests_collection.find_one({
-                "user_id": ObjectId(liked_id),
-                "target_id": user_id,
+    # Source 1: Match tab swipes — likes reciprocated by the target, resolved
+    # in one aggregation instead of one find_one per liked id.
+    mutual_ids = [
+        doc["_id"]
+        for doc in match_interests_collection.aggregate([
+            {"$match": {
+                "user_id": ObjectId(user_id),
                 "action": "like",
-            }):
-                add_match(liked_id)
-        except Exception:
-            pass
+                "target_type": {"$in": ["user", "mentor"]},
+            }},
+            {"$group": {"_id": "$target_id", "liked_at": {"$min": "$timestamp"}}},
+            {"$sort": {"liked_at": 1, "_id": 1}},
+            {"$lookup": {
+                "from": match_interests_collection.name,
+                "let": {"liked_id": {"$convert": {"input": "$_id", "to": "objectId", "onError": None, "onNull": None}}},
+                "pipeline": [
+                    {"$match": {
+                        "target_id": user_id,
+                        "action": "like",
+                        "$expr": {"$eq": ["$user_id", "$$liked_id"]},
+                    }},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}},
+                ],
+                "as": "reciprocal",
+            }},
+            {"$match": {"reciprocal": {"$ne": []}}},
+            {"$project": {"_id": 1}},
+        ])
+    ]
 
     # Source 2: Accepted connection requests (Network tab)
-    current_user = users_collection.find_one({"_id": ObjectId(user_id)})
-    if current_user:
-        for conn_id in current_user.get("connections", []):
-            add_match(str(conn_id))
+    current_user = users_collection.find_one({"_id": ObjectId(user_id)}, {"connections": 1})
+    connection_ids = [str(c) for c in (current_user or {}).get("connections", [])]
+
+    ordered_ids = list(dict.fromkeys(mutual_ids + connection_ids))
+    oids = [ObjectId(uid) for uid in ordered_ids if ObjectId.is_valid(uid)]
+    users = {
+        str(u["_id"]): u
+        for u in users_collection.find({"_id": {"$in": oids}}, _MATCH_SUMMARY_FIELDS)
+    } if oids else {}
+
+    matches = []
+    for uid in ordered_ids:
+        u = users.get(uid)
+        if u is None:
+            continue
+        matches.append({
+            "id": uid,
+            "name": u.get("name", ""),
+            "role": u.get("role", ""),
+            "bio": u.get("bio", ""),
+            "skills": u.get("skills", []),
+            "interests": u.get("interests", []),
+        })
 
     return jsonify({"matches": matches})
 
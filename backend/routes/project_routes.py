@@ -4,6 +4,8 @@ from bson.objectid import ObjectId
 from datetime import datetime
 from extensions import projects_collection, users_collection, project_invites_collection, project_activity_collection, socketio
 from utils.notifications import create_notification
+from services.embedding_service import invalidate_project_embedding
+from jobs.knowledge_index import enqueue_reindex
 project_bp = Blueprint("projects", __name__)
 
 
@@ -62,6 +64,8 @@ def _log_project_activity(project_id, event_type, actor_id=None, actor_name="",
         "metadata": metadata or {},
         "created_at": datetime.utcnow()
     })
+    # Every workspace write logs activity, so this keeps RAG knowledge current.
+    enqueue_reindex(project_id)
 
 
 def _serialize_activity(activity):
@@ -612,6 +616,7 @@ def delete_project(project_id):
     )
     _emit_workspace_update(project_id, "project_deleted", f"Deleted project {project.get('title', '')}")
     projects_collection.delete_one({"_id": ObjectId(project_id)})
+    invalidate_project_embedding(project_id)
 
     return jsonify({"msg": "Project deleted"})
 @project_bp.route("/<project_id>/archive", methods=["PUT", "OPTIONS"])
@@ -633,6 +638,7 @@ def archive_project(project_id):
         {"_id": ObjectId(project_id)},
         {"$set": {"archived": True, "archived_at": datetime.utcnow()}}
     )
+    invalidate_project_embedding(project_id)
     actor = _get_current_user()
     _log_project_activity(
         project_id,
@@ -4,6 +4,7 @@ from bson.objectid import ObjectId
 from datetime import datetime
 from extensions import tasks_collection, users_collection, project_activity_collection, socketio
 from utils.notifications import create_notification
+from jobs.knowledge_index import enqueue_reindex
 
 tasks_bp = Blueprint("tasks", __name__)
 
@@ -46,6 +47,7 @@ def _log_task_activity(project_id, user_id, message, event_type, metadata=None):
         "metadata": metadata or {},
         "created_at": datetime.utcnow()
     })
+    enqueue_reindex(project_id)
 
 
 def _emit_workspace_update(project_id, event_type, message=""):
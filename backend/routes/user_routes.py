@@ -4,9 +4,52 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from extensions import users_collection, projects_collection, db
 from datetime import datetime
+import heapq
+import time
+from utils.emails import EMAIL_INDEX_NAME
 
 users_bp = Blueprint("users", __name__)
 
+MATCH_LIMIT = 20
+_MATCH_FIELDS = {
+    "name": 1, "email": 1, "role": 1, "skills": 1, "interests": 1, "bio": 1,
+    "tags": 1, "connections": 1, "created_at": 1,
+}
+EMAIL_INDEX_RECHECK_SECONDS = 300
+_email_unique = False
+_email_checked_at = None
+
+
+def _emails_unique() -> bool:
+    """True once dedupe_users.py has created the unique normalised-email index."""
+    global _email_unique, _email_checked_at
+    if _email_unique or (
+        _email_checked_at is not None
+        and time.monotonic() - _email_checked_at < EMAIL_INDEX_RECHECK_SECONDS
+    ):
+        return _email_unique
+    _email_checked_at = time.monotonic()
+    try:
+        _email_unique = EMAIL_INDEX_NAME in users_collection.index_information()
+    except Exception as e:
+        print(f"[users] could not read indexes: {e}")
+    return _email_unique
+
+
+def _dedupe_by_email(users: list) -> list:
+    """Keep the first (most recently created) account per email."""
+    if _emails_unique():
+        return [u for u in users if u.get("email", "").strip()]
+    seen_emails: set = set()
+    unique = []
+    for u in users:
+        email = u.get("email", "").strip().lower()
+        if email and email not in seen_emails:
+            seen_emails.add(email)
+            unique.append(u)
+    return unique
+
+
 @users_bp.route("/match", methods=["GET"])
 @jwt_required()
 def match_users():
@@ -17,22 +60,43 @@ def match_users():
         return jsonify({"error": "User not found"}), 404
 
     my_tags = set(current_user.get("tags", []))
+    base_query = {"_id": {"$ne": ObjectId(user_id)}, "name": {"$exists": True, "$ne": ""}}
 
-    raw_users = list(users_collection.find(
-        {"_id": {"$ne": ObjectId(user_id)}, "name": {"$exists": True, "$ne": ""}},
-        sort=[("created_at", -1)]
-    ))
-    # Deduplicate by email — keep the most recently created account per email
-    seen_emails: set = set()
-    all_users = []
-    for u in raw_users:
-        email = u.get("email", "").strip().lower()
-        if email and email not in seen_emails:
-            seen_emails.add(email)
-            all_users.append(u)
+    # Candidate generation through the multikey index on tags: only users
+    # sharing at least one tag are read, newest first.
+    candidates = []
+    if my_tags:
+        candidates = list(users_collection.find(
+            {**base_query, "tags": {"$in": list(my_tags)}},
+            _MATCH_FIELDS,
+            sort=[("created_at", -1)]
+        ))
+    candidates = _dedupe_by_email(candidates)
+
+    # Keep the best 20 by shared tags, ties broken by most recent account.
+    ranked = heapq.nlargest(
+        MATCH_LIMIT,
+        enumerate(candidates),
+        key=lambda pair: (len(my_tags.intersection(pair[1].get("tags", []))), -pair[0])
+    )
+    winners = [u for _, u in ranked]
 
-    # Count projects per user in one aggregation query
-    user_oids = [u["_id"] for u in all_users]
+    # Too few tag matches: pad with the most recent users, as the full scan did.
+    if len(winners) < MATCH_LIMIT:
+        seen_emails = {u.get("email", "").strip().lower() for u in winners}
+        recent = users_collection.find(
+            {**base_query, "_id": {"$nin": [ObjectId(user_id)] + [u["_id"] for u in candidates]}},
+            _MATCH_FIELDS,
+            sort=[("created_at", -1)]
+        ).limit(MATCH_LIMIT * 2)
+        for u in _dedupe_by_email(list(recent)):
+            if len(winners) >= MATCH_LIMIT:
+                break
+            if u.get("email", "").strip().lower() not in seen_emails:
+                winners.append(u)
+
+    # Count projects only for the winners, in one aggregation query
+    user_oids = [u["_id"] for u in winners]
     project_counts: dict = {}
     if user_oids:
         for doc in projects_collection.aggregate([
@@ -44,7 +108,7 @@ def match_users():
             project_counts[str(doc["_id"])] = doc["count"]
 
     matches = []
-    for u in all_users:
+    for u in winners:
         score = len(my_tags.intersection(set(u.get("tags", []))))
         uid = str(u["_id"])
         matches.append({
@@ -61,9 +125,7 @@ def match_users():
             "score": score
         })
 
-    matches.sort(key=lambda x: x["score"], reverse=True)
-
-    return jsonify({"matches": matches[:20]})
+    return jsonify({"matches": matches})
 
 @users_bp.route("/update-bio", methods=["POST"])
 @jwt_required()
@@ -1,9 +1,17 @@
 import os
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google import genai
+from pymongo import UpdateOne
 from extensions import match_explanations_collection
 from datetime import datetime, timedelta
 
+EXPLANATION_WORKERS = int(os.getenv("MATCH_EXPLANATION_WORKERS", "5"))
+MAX_PAIRS_PER_PROMPT = int(os.getenv("MATCH_EXPLANATION_PAIRS_PER_PROMPT", "10"))
+FALLBACK_EXPLANATION = "Strong skill and interest alignment — great potential collaborators."
+
 _client = None
+_executor = ThreadPoolExecutor(max_workers=EXPLANATION_WORKERS, thread_name_prefix="match-explain")
 
 
 def _get_client():
@@ -35,45 +43,105 @@ def _profile_summary(user: dict) -> str:
     return summary
 
 
-def get_match_explanation(user_a: dict, user_b: dict) -> str:
-    id_a = str(user_a.get("_id", ""))
-    id_b = str(user_b.get("_id", ""))
-    key_a, key_b = _sorted_key(id_a, id_b)
+def _cache_cutoff():
+    return datetime.utcnow() - timedelta(days=7)
+
 
-    cached = match_explanations_collection.find_one({
-        "user_a_id": key_a,
-        "user_b_id": key_b,
-        "created_at": {"$gt": datetime.utcnow() - timedelta(days=7)},
-    })
-    if cached:
-        return cached["explanation"]
+def _parse_explanations(content: str) -> list:
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+    parsed = json.loads(content)
+    return parsed if isinstance(parsed, list) else []
+
+
+def _generate_explanations(user_a: dict, candidates: list) -> dict:
+    """Explain user_a against every candidate with one prompt: {candidate_id: text}."""
+    id_a = str(user_a.get("_id", ""))
+    ids = [str(c["_id"]) for c in candidates]
+    collaborators = "\n".join(
+        f"{i + 1}. (id: {cid}) {_profile_summary(c)}" for i, (cid, c) in enumerate(zip(ids, candidates))
+    )
 
     prompt = f"""You are an AI assistant for a student startup collaboration platform.
 
 Collaborator A: {_profile_summary(user_a)}
-Collaborator B: {_profile_summary(user_b)}
 
-Write exactly 2 sentences explaining why these two people would be great startup collaborators. Be specific about their complementary skills or shared goals. Keep it energetic and actionable."""
+Potential collaborators:
+{collaborators}
+
+For EACH potential collaborator, write exactly 2 sentences explaining why they and Collaborator A would be great startup collaborators. Be specific about their complementary skills or shared goals. Keep it energetic and actionable.
+
+Return ONLY a JSON array (no markdown) with one object per collaborator, in the same order:
+[{{"id": "<id>", "explanation": "<2 sentences>"}}]"""
 
+    explanations = {}
     try:
         client = _get_client()
         response = client.models.generate_content(
             model="models/gemini-2.5-flash-lite",
             contents=prompt,
         )
-        explanation = response.text.strip()
+        for position, entry in enumerate(_parse_explanations(response.text.strip())):
+            if not isinstance(entry, dict) or not entry.get("explanation"):
+                continue
+            cid = str(entry.get("id", ""))
+            if cid not in ids and position < len(ids):
+                cid = ids[position]
+            if cid in ids:
+                explanations[cid] = str(entry["explanation"]).strip()
     except Exception as e:
         print(f"[ai_explanation] Gemini call failed: {e}")
-        explanation = "Strong skill and interest alignment — great potential collaborators."
-
-    match_explanations_collection.update_one(
-        {"user_a_id": key_a, "user_b_id": key_b},
-        {"$set": {
-            "user_a_id": key_a,
-            "user_b_id": key_b,
-            "explanation": explanation,
-            "created_at": datetime.utcnow(),
-        }},
-        upsert=True,
-    )
-    return explanation
+
+    # Only real explanations are cached; a pair that failed gets the fallback
+    # for this response and is generated again next time.
+    now = datetime.utcnow()
+    ops = []
+    for cid, explanation in explanations.items():
+        key_a, key_b = _sorted_key(id_a, cid)
+        ops.append(UpdateOne(
+            {"user_a_id": key_a, "user_b_id": key_b},
+            {"$set": {
+                "user_a_id": key_a,
+                "user_b_id": key_b,
+                "explanation": explanation,
+                "created_at": now,
+            }},
+            upsert=True,
+        ))
+    if ops:
+        match_explanations_collection.bulk_write(ops, ordered=False)
+    return {cid: explanations.get(cid, FALLBACK_EXPLANATION) for cid in ids}
+
+
+def get_cached_explanations(user_a: dict, candidate_ids: list) -> dict:
+    """Look up fresh cached explanations for many pairs with one $or query."""
+    id_a = str(user_a.get("_id", ""))
+    by_pair = {_sorted_key(id_a, str(cid)): str(cid) for cid in candidate_ids}
+    if not by_pair:
+        return {}
+
+    results = {}
+    for doc in match_explanations_collection.find({
+        "$or": [{"user_a_id": a, "user_b_id": b} for a, b in by_pair],
+        "created_at": {"$gt": _cache_cutoff()},
+    }, {"user_a_id": 1, "user_b_id": 1, "explanation": 1}):
+        cid = by_pair.get((doc["user_a_id"], doc["user_b_id"]))
+        if cid is not None:
+            results[cid] = doc["explanation"]
+    return results
+
+
+def stream_match_explanations(user_a: dict, candidates: list, on_result):
+    """Generate explanations in batched prompts, calling on_result(candidate_id, text) per pair."""
+    futures = [
+        _executor.submit(_generate_explanations, user_a, candidates[i:i + MAX_PAIRS_PER_PROMPT])
+        for i in range(0, len(candidates), MAX_PAIRS_PER_PROMPT)
+    ]
+    for future in as_completed(futures):
+        try:
+            for candidate_id, explanation in future.result().items():
+                on_result(candidate_id, explanation)
+        except Exception as e:
+            print(f"[ai_explanation] explanation batch failed: {e}")
@@ -0,0 +1,111 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from pymongo import UpdateOne
+from extensions import embedding_cache_collection
+
+# Content-addressed embedding cache: an LRU-bounded in-process front backed by
+# the embedding_cache collection. Keys hash (model, dimensionality, text), so
+# profiles, project chunks and queries with identical text share one entry.
+# The in-process front holds float32 arrays (4 bytes a dimension rather than a
+# boxed Python float) and is bounded by bytes; stored entries expire after
+# EMBED_CACHE_TTL_DAYS through a TTL index on created_at.
+
+MAX_MEMORY_BYTES = int(os.getenv("EMBED_CACHE_MEMORY_MB", "64")) * 1024 * 1024
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+_memory_bytes = 0
+_stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "evictions": 0}
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(text: str, model: str, dimensionality: int | None = None) -> str:
+    raw = f"{model}|{dimensionality or 'full'}|{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, embedding: list):
+    global _memory_bytes
+    vector = np.asarray(embedding, dtype=np.float32)
+    previous = _memory.pop(key, None)
+    if previous is not None:
+        _memory_bytes -= previous.nbytes
+    _memory[key] = vector
+    _memory_bytes += vector.nbytes
+    while _memory_bytes > MAX_MEMORY_BYTES and len(_memory) > 1:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= evicted.nbytes
+        _stats["evictions"] += 1
+
+
+def get_many(keys: list) -> dict:
+    found = {}
+    with _lock:
+        for key in keys:
+            embedding = _memory.get(key)
+            if embedding is not None:
+                _memory.move_to_end(key)
+                found[key] = embedding.tolist()
+        _stats["memory_hits"] += len(found)
+
+    remaining = [k for k in dict.fromkeys(keys) if k not in found]
+    if not remaining:
+        return found
+
+    try:
+        docs = list(embedding_cache_collection.find(
+            {"_id": {"$in": remaining}}, {"embedding": 1}
+        ))
+    except Exception as e:
+        print(f"[embedding_cache] lookup failed: {e}")
+        docs = []
+
+    with _lock:
+        for doc in docs:
+            found[doc["_id"]] = doc["embedding"]
+            _remember(doc["_id"], doc["embedding"])
+        _stats["store_hits"] += len(docs)
+        _stats["misses"] += len(remaining) - len(docs)
+    return found
+
+
+def put_many(entries: dict, model: str, dimensionality: int | None = None):
+    if not entries:
+        return
+    with _lock:
+        for key, embedding in entries.items():
+            _remember(key, embedding)
+    now = datetime.utcnow()
+    try:
+        embedding_cache_collection.bulk_write([
+            UpdateOne(
+                {"_id": key},
+                {"$set": {
+                    "embedding": embedding,
+                    "model": model,
+                    "dimensionality": dimensionality,
+                    "created_at": now,
+                }},
+                upsert=True,
+            )
+            for key, embedding in entries.items()
+        ], ordered=False)
+    except Exception as e:
+        print(f"[embedding_cache] write failed: {e}")
+
+
+def metrics() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory)
+        stats["memory_bytes"] = _memory_bytes
+    lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+    stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from google import genai
+from google.genai import types
+from services import embedding_cache
+
+# Single entry point for embed_content calls. Concurrent requests are
+# coalesced into provider-sized batches (flushed when full or after a short
+# wait window) and identical texts share one in-flight request.
+
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "100"))
+MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "10"))
+MAX_CONCURRENT_BATCHES = int(os.getenv("EMBED_MAX_CONCURRENT_BATCHES", "4"))
+# Matryoshka-style truncation; unset/0 keeps the model's full 3072 dims.
+OUTPUT_DIMENSIONALITY = int(os.getenv("EMBEDDING_OUTPUT_DIM", "0")) or None
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not set in environment")
+        _client = genai.Client(api_key=api_key)
+    return _client
+
+
+class EmbeddingGateway:
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS,
+                 max_concurrent_batches: int = MAX_CONCURRENT_BATCHES):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._cond = threading.Condition()
+        self._pending = []
+        self._inflight = {}
+        self._worker = None
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent_batches,
+                                        thread_name_prefix="embed-batch")
+        self._stats = {
+            "requests": 0,
+            "deduplicated": 0,
+            "batches": 0,
+            "texts_embedded": 0,
+            "max_batch_size": 0,
+            "last_batch_size": 0,
+            "errors": 0,
+        }
+
+    def submit(self, text: str, dimensionality: int | None = None) -> Future:
+        key = (text, dimensionality)
+        with self._cond:
+            self._stats["requests"] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["deduplicated"] += 1
+                return future
+            future = Future()
+            self._inflight[key] = future
+            self._pending.append(key)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embed-gateway", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+            return future
+
+    def embed(self, text: str, dimensionality: int | None = None, timeout: float | None = None) -> list:
+        return self.submit(text, dimensionality).result(timeout)
+
+    def embed_many(self, texts: list, dimensionality: int | None = None, timeout: float | None = None) -> list:
+        futures = [self.submit(t, dimensionality) for t in texts]
+        return [f.result(timeout) for f in futures]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            groups = {}
+            for key in batch:
+                groups.setdefault(key[1], []).append(key)
+            for group in groups.values():
+                self._pool.submit(self._dispatch, group)
+
+    def _embed_batch(self, batch: list) -> list:
+        dimensionality = batch[0][1]
+        result = _get_client().models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=[text for text, _ in batch],
+            config=types.EmbedContentConfig(output_dimensionality=dimensionality) if dimensionality else None,
+        )
+        return [e.values for e in result.embeddings]
+
+    def _dispatch(self, batch: list):
+        try:
+            vectors = self._embed_batch(batch)
+            if len(vectors) != len(batch):
+                raise ValueError(f"expected {len(batch)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            print(f"[embedding_gateway] batch of {len(batch)} failed: {e}")
+            with self._cond:
+                self._stats["errors"] += 1
+                futures = [self._inflight.pop(key) for key in batch]
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        with self._cond:
+            self._stats["batches"] += 1
+            self._stats["texts_embedded"] += len(batch)
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            futures = [self._inflight.pop(key) for key in batch]
+        for future, vector in zip(futures, vectors):
+            future.set_result(list(vector))
+
+    def metrics(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._pending)
+            stats["in_flight"] = len(self._inflight)
+        stats["mean_batch_size"] = (
+            round(stats["texts_embedded"] / stats["batches"], 2) if stats["batches"] else 0.0
+        )
+        return stats
+
+
+_gateway = EmbeddingGateway()
+
+
+def embed(text: str, timeout: float | None = None, dimensionality: int | None = OUTPUT_DIMENSIONALITY) -> list:
+    return embed_many([text], timeout, dimensionality)[0]
+
+
+def embed_many(texts: list, timeout: float | None = None,
+               dimensionality: int | None = OUTPUT_DIMENSIONALITY) -> list:
+    """Embed texts, serving repeats from the content-hash cache."""
+    keys = [embedding_cache.cache_key(t, EMBEDDING_MODEL, dimensionality) for t in texts]
+    cached = embedding_cache.get_many(keys)
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+    if missing:
+        vectors = _gateway.embed_many(list(missing.values()), dimensionality, timeout)
+        fresh = dict(zip(missing, vectors))
+        embedding_cache.put_many(fresh, EMBEDDING_MODEL, dimensionality)
+        cached.update(fresh)
+
+    return [cached[key] for key in keys]
+
+
+def metrics() -> dict:
+    return _gateway.metrics()
@@ -1,20 +1,9 @@
-import os
+import hashlib
 import numpy as np
-from google import genai
-from extensions import user_embeddings_collection
+from pymongo import UpdateOne
+from extensions import users_collection, user_embeddings_collection, project_embeddings_collection
 from datetime import datetime
-
-_client = None
-
-
-def _get_client():
-    global _client
-    if _client is None:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not set in environment")
-        _client = genai.Client(api_key=api_key)
-    return _client
+from services import embedding_gateway, match_feed_store, people_index, user_matrix
 
 
 def build_profile_text(user: dict) -> str:
@@ -38,29 +27,55 @@ def build_profile_text(user: dict) -> str:
     return " ".join(parts)
 
 
-def generate_embedding(text: str) -> list:
-    client = _get_client()
-    result = client.models.embed_content(
-        model="models/gemini-embedding-001",
-        contents=text,
-    )
-    return result.embeddings[0].values
+def generate_embedding(text: str, output_dimensionality: int | None = embedding_gateway.OUTPUT_DIMENSIONALITY) -> list:
+    return embedding_gateway.embed(text, dimensionality=output_dimensionality)
+
+
+def generate_embeddings(texts: list, output_dimensionality: int | None = embedding_gateway.OUTPUT_DIMENSIONALITY) -> list:
+    return embedding_gateway.embed_many(texts, dimensionality=output_dimensionality)
+
+
+def _clear_pending(user: dict):
+    """Take a user registered with embedding_pending off jobs.embedding_backfill's list."""
+    if user.get("embedding_pending"):
+        users_collection.update_one(
+            {"_id": user["_id"]}, {"$unset": {"embedding_pending": "", "embedding_claimed_until": ""}}
+        )
 
 
 def upsert_user_embedding(user: dict) -> list:
     user_id = str(user["_id"])
+    role = user.get("role", "student")
     text = build_profile_text(user)
+
+    existing = user_embeddings_collection.find_one(
+        {"user_id": user_id}, {"embedding": 1, "text_used": 1, "role": 1, "output_dimensionality": 1}
+    )
+    if existing and existing.get("embedding") and existing.get("text_used") == text \
+            and existing.get("role") == role \
+            and existing.get("output_dimensionality") == embedding_gateway.OUTPUT_DIMENSIONALITY:
+        user_matrix.upsert(user_id, role, existing["embedding"])
+        _clear_pending(user)
+        return list(existing["embedding"])
+
     embedding = generate_embedding(text)
     user_embeddings_collection.update_one(
         {"user_id": user_id},
         {"$set": {
             "user_id": user_id,
+            "role": role,
             "embedding": list(embedding),
+            "output_dimensionality": embedding_gateway.OUTPUT_DIMENSIONALITY,
             "text_used": text,
             "updated_at": datetime.utcnow(),
         }},
         upsert=True,
     )
+    user_matrix.upsert(user_id, role, embedding)
+    people_index.upsert(user_id, role, embedding)
+
+    match_feed_store.mark_stale(user_id)
+    _clear_pending(user)
     return list(embedding)
 
 
@@ -69,6 +84,69 @@ def get_stored_embedding(user_id: str) -> list | None:
     return doc["embedding"] if doc else None
 
 
+def build_project_text(project: dict) -> str:
+    return (
+        f"{project.get('title', '')}. "
+        f"{project.get('description', '')}. "
+        f"Skills needed: {', '.join(project.get('skills_required', []))}. "
+        f"Category: {project.get('category', '')}."
+    )
+
+
+def project_content_hash(project: dict) -> str:
+    raw = f"{embedding_gateway.OUTPUT_DIMENSIONALITY or 'full'}|{build_project_text(project)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_project_embeddings(projects: list) -> dict:
+    """Return {project_id: embedding}, embedding only projects whose content changed."""
+    if not projects:
+        return {}
+    hashes = {str(p["_id"]): project_content_hash(p) for p in projects}
+    stored = {
+        doc["project_id"]: doc
+        for doc in project_embeddings_collection.find(
+            {"project_id": {"$in": list(hashes)}},
+            {"project_id": 1, "content_hash": 1, "embedding": 1},
+        )
+    }
+
+    embeddings = {}
+    stale = []
+    for project in projects:
+        pid = str(project["_id"])
+        doc = stored.get(pid)
+        if doc and doc.get("content_hash") == hashes[pid]:
+            embeddings[pid] = doc["embedding"]
+        else:
+            stale.append(project)
+
+    if stale:
+        vectors = generate_embeddings([build_project_text(p) for p in stale])
+        now = datetime.utcnow()
+        ops = []
+        for project, vector in zip(stale, vectors):
+            pid = str(project["_id"])
+            embeddings[pid] = list(vector)
+            ops.append(UpdateOne(
+                {"project_id": pid},
+                {"$set": {
+                    "project_id": pid,
+                    "content_hash": hashes[pid],
+                    "embedding": list(vector),
+                    "updated_at": now,
+                }},
+                upsert=True,
+            ))
+        project_embeddings_collection.bulk_write(ops, ordered=False)
+
+    return embeddings
+
+
+def invalidate_project_embedding(project_id: str):
+    project_embeddings_collection.delete_one({"project_id": str(project_id)})
+
+
 def cosine_similarity(a: list, b: list) -> float:
     va = np.array(a, dtype=np.float32)
     vb = np.array(b, dtype=np.float32)
@@ -0,0 +1,76 @@
+import os
+import json
+import base64
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+# Opaque (score, id) cursors over the ranked match feed, plus a short-lived
+# per-user cache of the full ranking so later pages only hydrate page-size
+# candidates instead of re-ranking.
+
+RANKING_DEPTH = int(os.getenv("MATCH_RANKING_DEPTH", "500"))
+RANKING_TTL_SECONDS = float(os.getenv("MATCH_RANKING_TTL_SECONDS", "300"))
+MAX_CACHED_RANKINGS = int(os.getenv("MATCH_RANKING_CACHE_SIZE", "2000"))
+
+_lock = threading.Lock()
+_rankings = OrderedDict()
+
+
+def encode_cursor(score: int, item_id: str) -> str:
+    raw = json.dumps([score, item_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Raise ValueError when the cursor was not produced by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, item_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(score), str(item_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _sort_key(score: int, item_id: str) -> tuple:
+    return (-score, item_id)
+
+
+def position_after(ranked: list, cursor: tuple | None) -> int:
+    """Index of the first (score, id) entry that sorts strictly after the cursor."""
+    if cursor is None:
+        return 0
+    keys = [_sort_key(score, item_id) for score, item_id in ranked]
+    return bisect.bisect_right(keys, _sort_key(*cursor))
+
+
+def get_ranking(user_id: str, feed_type: str) -> list | None:
+    key = (str(user_id), feed_type)
+    with _lock:
+        entry = _rankings.get(key)
+        if entry is None:
+            return None
+        expires_at, ranked = entry
+        if expires_at < time.monotonic():
+            del _rankings[key]
+            return None
+        _rankings.move_to_end(key)
+        return ranked
+
+
+def put_ranking(user_id: str, feed_type: str, ranked: list):
+    with _lock:
+        _rankings[(str(user_id), feed_type)] = (time.monotonic() + RANKING_TTL_SECONDS, ranked)
+        _rankings.move_to_end((str(user_id), feed_type))
+        while len(_rankings) > MAX_CACHED_RANKINGS:
+            _rankings.popitem(last=False)
+
+
+def discard_item(user_id: str, item_id: str):
+    """Drop a candidate the user has acted on from their cached rankings."""
+    item_id = str(item_id)
+    with _lock:
+        for key, (expires_at, ranked) in list(_rankings.items()):
+            if key[0] == str(user_id):
+                _rankings[key] = (expires_at, [entry for entry in ranked if entry[1] != item_id])
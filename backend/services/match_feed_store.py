@@ -0,0 +1,84 @@
+import os
+from datetime import datetime, timedelta
+from extensions import match_feeds_collection
+
+# Materialised top-N match feeds, one document per (user_id, feed_type).
+# Written by the refresh job or by a live ranking fallback, read by
+# GET /api/match/feed. New users and projects reach other people's feeds
+# when those expire (FEED_TTL_MINUTES); only the owner's own edits mark a
+# feed stale early.
+
+FEED_SIZE = int(os.getenv("MATCH_FEED_SIZE", "50"))
+FEED_TTL_MINUTES = int(os.getenv("MATCH_FEED_TTL_MINUTES", "60"))
+CLAIM_LEASE_MINUTES = int(os.getenv("MATCH_FEED_CLAIM_MINUTES", "10"))
+FEED_TYPES = ("teammates", "mentors", "projects")
+
+
+def _fresh_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(minutes=FEED_TTL_MINUTES)
+
+
+def get_feed(user_id: str, feed_type: str) -> list | None:
+    """Return the materialised items, or None when missing or stale."""
+    doc = match_feeds_collection.find_one(
+        {"user_id": str(user_id), "feed_type": feed_type},
+        {"items": 1, "stale": 1, "computed_at": 1},
+    )
+    if not doc or doc.get("stale") or doc.get("computed_at", datetime.min) < _fresh_cutoff():
+        return None
+    return doc.get("items", [])
+
+
+def save_feed(user_id: str, feed_type: str, items: list):
+    match_feeds_collection.update_one(
+        {"user_id": str(user_id), "feed_type": feed_type},
+        {
+            "$set": {
+                "user_id": str(user_id),
+                "feed_type": feed_type,
+                "items": items,
+                "stale": False,
+                "computed_at": datetime.utcnow(),
+            },
+            "$unset": {"claimed_until": ""},
+        },
+        upsert=True,
+    )
+
+
+def remove_item(user_id: str, target_id: str):
+    """Drop a candidate the user has just acted on from their materialised feeds."""
+    match_feeds_collection.update_many(
+        {"user_id": str(user_id)},
+        {"$pull": {"items": {"id": str(target_id)}}},
+    )
+
+
+def mark_stale(user_id: str):
+    match_feeds_collection.update_many({"user_id": str(user_id)}, {"$set": {"stale": True}})
+
+
+def claim_due(limit: int, lease_minutes: int = CLAIM_LEASE_MINUTES) -> list:
+    """Claim up to limit stale or expired feeds, oldest first, as (user_id, feed_type).
+
+    Each claim is a single find_one_and_update, so when the refresh job runs in
+    every worker process no feed is handed to two of them; a claim that is
+    never saved lapses after lease_minutes.
+    """
+    now = datetime.utcnow()
+    query = {
+        "$or": [{"stale": True}, {"computed_at": {"$lt": _fresh_cutoff()}}],
+        "claimed_until": {"$not": {"$gt": now}},
+    }
+    claimed = []
+    while len(claimed) < limit:
+        doc = match_feeds_collection.find_one_and_update(
+            query,
+            {"$set": {"claimed_until": now + timedelta(minutes=lease_minutes)}},
+            projection={"user_id": 1, "feed_type": 1},
+            sort=[("computed_at", 1)],
+        )
+        if doc is None:
+            break
+        claimed.append((doc["user_id"], doc["feed_type"]))
+    return claimed
@@ -1,17 +1,29 @@
+import os
+import numpy as np
 from bson import ObjectId
 from extensions import users_collection, projects_collection, match_interests_collection
 from services.embedding_service import (
     get_stored_embedding,
     upsert_user_embedding,
-    generate_embedding,
-    cosine_similarity,
+    get_project_embeddings,
 )
+from services import people_index, user_matrix
+
+# Above this many candidates in a role, rank with the HNSW index instead of
+# the exact matrix scan.
+ANN_MIN_CANDIDATES = int(os.getenv("MATCH_ANN_MIN_CANDIDATES", "20000"))
+
+_PERSON_FIELDS = {"name": 1, "role": 1, "bio": 1, "skills": 1, "interests": 1}
+_PROJECT_TEXT_FIELDS = {
+    "title": 1, "description": 1, "skills_required": 1, "category": 1,
+    "owner_id": 1, "team_members": 1,
+}
 
 
 def _get_acted_ids(user_id: str) -> set:
     return set(
         doc["target_id"]
-        for doc in match_interests_collection.find({"user_id": ObjectId(user_id)})
+        for doc in match_interests_collection.find({"user_id": ObjectId(user_id)}, {"target_id": 1})
     )
 
 
@@ -27,7 +39,51 @@ def _ensure_embedding(user: dict) -> list | None:
     return embedding
 
 
-def get_ranked_feed(current_user: dict, feed_type: str, limit: int = 20) -> list:
+def _rank_people(user_id: str, current_embedding: list, role: str, acted_ids: set, depth: int) -> list:
+    user_matrix.refresh()
+    exclude = acted_ids | {user_id}
+    if user_matrix.partition_size(role) >= ANN_MIN_CANDIDATES:
+        # None until jobs.people_index has built or loaded this role's index.
+        ranked = people_index.top_k(role, current_embedding, depth, exclude)
+        if ranked is not None:
+            return ranked
+    return user_matrix.top_k(role, current_embedding, depth, exclude)
+
+
+def _rank_projects(user_id: str, current_embedding: list, acted_ids: set) -> list:
+    candidates = []
+    for project in projects_collection.find({"archived": {"$ne": True}}, _PROJECT_TEXT_FIELDS):
+        pid = str(project["_id"])
+        if pid in acted_ids:
+            continue
+        if str(project.get("owner_id", "")) == user_id:
+            continue
+        if user_id in [str(m) for m in project.get("team_members", [])]:
+            continue
+        candidates.append(project)
+
+    try:
+        embeddings = get_project_embeddings(candidates)
+    except Exception as e:
+        print(f"[matching] failed to embed projects: {e}")
+        embeddings = {}
+
+    sims = {}
+    scored_ids = list(embeddings)
+    if scored_ids:
+        # Compare on the shared Matryoshka prefix if dimensionality changed.
+        dims = min(len(current_embedding), *(len(embeddings[pid]) for pid in scored_ids))
+        matrix = np.array([embeddings[pid][:dims] for pid in scored_ids], dtype=np.float32)
+        query = np.array(current_embedding[:dims], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        values = np.divide(matrix @ query, norms, out=np.zeros(len(scored_ids), dtype=np.float32), where=norms > 0)
+        sims = dict(zip(scored_ids, values.tolist()))
+
+    return [(str(p["_id"]), sims.get(str(p["_id"]), 0.0)) for p in candidates]
+
+
+def rank_feed(current_user: dict, feed_type: str, depth: int) -> list:
+    """Rank candidates as [(score, id)] in feed order: score desc, then id asc."""
     user_id = str(current_user["_id"])
 
     current_embedding = _ensure_embedding(current_user)
@@ -35,22 +91,36 @@ def get_ranked_feed(current_user: dict, feed_type: str, limit: int = 20) -> list
         return []
 
     acted_ids = _get_acted_ids(user_id)
+
+    if feed_type in ("teammates", "mentors"):
+        role_filter = "mentor" if feed_type == "mentors" else "student"
+        ranked = _rank_people(user_id, current_embedding, role_filter, acted_ids, depth)
+    elif feed_type == "projects":
+        ranked = _rank_projects(user_id, current_embedding, acted_ids)
+    else:
+        return []
+
+    ranked = sorted(((round(sim * 100), cid) for cid, sim in ranked), key=lambda x: (-x[0], x[1]))
+    return ranked[:depth]
+
+
+def hydrate_feed(feed_type: str, ranked: list) -> list:
+    """Turn [(score, id)] into feed items, fetching only those candidates."""
+    if not ranked:
+        return []
+    oids = [ObjectId(cid) for _, cid in ranked]
     results = []
 
     if feed_type in ("teammates", "mentors"):
         role_filter = "mentor" if feed_type == "mentors" else "student"
-        query = {
-            "_id": {"$ne": ObjectId(user_id)},
-            "role": role_filter,
+        candidates = {
+            str(c["_id"]): c
+            for c in users_collection.find({"_id": {"$in": oids}, "role": role_filter}, _PERSON_FIELDS)
         }
-        for candidate in users_collection.find(query):
-            cid = str(candidate["_id"])
-            if cid in acted_ids:
-                continue
-            candidate_embedding = _ensure_embedding(candidate)
-            if candidate_embedding is None:
+        for score, cid in ranked:
+            candidate = candidates.get(cid)
+            if candidate is None:
                 continue
-            sim = cosine_similarity(current_embedding, candidate_embedding)
             results.append({
                 "id": cid,
                 "name": candidate.get("name", ""),
@@ -58,33 +128,19 @@ def get_ranked_feed(current_user: dict, feed_type: str, limit: int = 20) -> list
                 "bio": candidate.get("bio", ""),
                 "skills": candidate.get("skills", []),
                 "interests": candidate.get("interests", []),
-                "score": round(sim * 100),
+                "score": score,
                 "ai_explanation": None,
             })
 
     elif feed_type == "projects":
-        for project in projects_collection.find({"archived": {"$ne": True}}):
-            pid = str(project["_id"])
-            if pid in acted_ids:
-                continue
-            if str(project.get("owner_id", "")) == user_id:
-                continue
-            if user_id in [str(m) for m in project.get("team_members", [])]:
+        projects = {
+            str(p["_id"]): p
+            for p in projects_collection.find({"_id": {"$in": oids}, "archived": {"$ne": True}})
+        }
+        for score, pid in ranked:
+            project = projects.get(pid)
+            if project is None:
                 continue
-
-            proj_text = (
-                f"{project.get('title', '')}. "
-                f"{project.get('description', '')}. "
-                f"Skills needed: {', '.join(project.get('skills_required', []))}. "
-                f"Category: {project.get('category', '')}."
-            )
-            try:
-                proj_embedding = generate_embedding(proj_text)
-                sim = cosine_similarity(current_embedding, proj_embedding)
-                score = round(sim * 100)
-            except Exception:
-                score = 0
-
             results.append({
                 "id": pid,
                 "title": project.get("title", ""),
@@ -97,5 +153,4 @@ def get_ranked_feed(current_user: dict, feed_type: str, limit: int = 20) -> list
                 "ai_explanation": None,
             })
 
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:limit]
+    return results
@@ -0,0 +1,285 @@
+import os
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import faiss
+import numpy as np
+from config import PEOPLE_INDEX_DIR
+from extensions import user_embeddings_collection
+from rag import versioned_files
+from utils.embeddings import normalize_embedding
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process
+    fcntl = None
+
+# Per-role HNSW index over normalised profile embeddings, used instead of the
+# brute-force matrix scan once a role partition is large. HNSW cannot delete,
+# so re-embedded users get a fresh id and the old one is tombstoned until the
+# next rebuild. Saves publish the index and its labels together as one
+# versioned file set (rag/versioned_files.py), so a worker loading mid-save
+# never pairs a new index with old labels.
+#
+# Building, refreshing, rebuilding and saving all happen in jobs.people_index,
+# never on a request: top_k only searches whatever index this worker has
+# loaded and returns None until there is one. One worker at a time (a
+# non-blocking lock file) builds and publishes; the others load what it
+# published and apply newer embeddings incrementally.
+
+HNSW_M = int(os.getenv("PEOPLE_INDEX_HNSW_M", "32"))
+EF_CONSTRUCTION = int(os.getenv("PEOPLE_INDEX_EF_CONSTRUCTION", "80"))
+EF_SEARCH = int(os.getenv("PEOPLE_INDEX_EF_SEARCH", "128"))
+SAVE_INTERVAL_SECONDS = float(os.getenv("PEOPLE_INDEX_SAVE_MINUTES", "30")) * 60
+REBUILD_TOMBSTONE_RATIO = 0.2
+
+os.makedirs(PEOPLE_INDEX_DIR, exist_ok=True)
+
+_lock = threading.RLock()
+_indexes = {}
+
+
+def _stem(role: str):
+    return f"people_{role}"
+
+
+def _legacy_paths(role: str):
+    # Unversioned files written before manifests; read until the next save.
+    return (
+        os.path.join(PEOPLE_INDEX_DIR, f"people_{role}.index"),
+        os.path.join(PEOPLE_INDEX_DIR, f"people_{role}_labels.json"),
+    )
+
+
+def _write_json(path: str, data: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+@contextmanager
+def _builder_lock(role: str):
+    """Yield True when this process may build and publish the role's index."""
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(PEOPLE_INDEX_DIR, f"people_{role}.lock"), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            acquired = False
+        else:
+            acquired = True
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _signature(role: str):
+    return versioned_files.signature(PEOPLE_INDEX_DIR, _stem(role))
+
+
+def _new_faiss_index(dim: int):
+    base = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    base.hnsw.efConstruction = EF_CONSTRUCTION
+    base.hnsw.efSearch = EF_SEARCH
+    return faiss.IndexIDMap2(base)
+
+
+class _RoleIndex:
+    def __init__(self, role: str, index, labels: dict, next_id: int, synced_at=None):
+        self.role = role
+        self.index = index
+        self.labels = labels
+        self.live = {user_id: label for label, user_id in labels.items()}
+        self.next_id = next_id
+        self.synced_at = synced_at
+        self.signature = None
+        self.saved_at = time.monotonic()
+        self.dirty = False
+
+    @property
+    def dim(self) -> int:
+        return self.index.d
+
+    @property
+    def tombstones(self) -> int:
+        return self.index.ntotal - len(self.live)
+
+    def has_vector(self, user_id: str, vector: np.ndarray) -> bool:
+        label = self.live.get(user_id)
+        return label is not None and np.allclose(self.index.reconstruct(label), vector, atol=1e-6)
+
+    def add(self, user_id: str, vector: np.ndarray):
+        old = self.live.pop(user_id, None)
+        if old is not None:
+            self.labels.pop(old, None)
+        label = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vector.reshape(1, -1), np.array([label], dtype="int64"))
+        self.labels[label] = user_id
+        self.live[user_id] = label
+        self.dirty = True
+
+    def search(self, query: np.ndarray, k: int, exclude: set) -> list:
+        excluded = sum(1 for x in exclude if x in self.live)
+        fetch = min(self.index.ntotal, k + excluded + self.tombstones)
+        if fetch <= 0:
+            return []
+        scores, labels = self.index.search(query.reshape(1, -1), fetch)
+        results = []
+        for score, label in zip(scores[0], labels[0]):
+            user_id = self.labels.get(int(label))
+            if user_id is None or user_id in exclude:
+                continue
+            results.append((user_id, float(score)))
+            if len(results) == k:
+                break
+        return results
+
+    def save(self):
+        # Only the in-memory copy is taken under _lock; searches don't wait
+        # on the file write.
+        with _lock:
+            data = faiss.serialize_index(self.index)
+            state = {
+                "labels": {str(k): v for k, v in self.labels.items()},
+                "next_id": self.next_id,
+                "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+            }
+            self.dirty = False
+        versioned_files.write_version(PEOPLE_INDEX_DIR, _stem(self.role), {
+            "index": lambda path: data.tofile(path),
+            "labels.json": lambda path: _write_json(path, state),
+        })
+        for path in _legacy_paths(self.role):
+            if os.path.exists(path):
+                os.remove(path)
+        self.signature = _signature(self.role)
+        self.saved_at = time.monotonic()
+
+
+def _load(role: str) -> _RoleIndex | None:
+    signature = _signature(role)
+    manifest = versioned_files.read_manifest(PEOPLE_INDEX_DIR, _stem(role))
+    if manifest is not None:
+        paths = versioned_files.resolve(PEOPLE_INDEX_DIR, manifest)
+        index_file, labels_file = paths["index"], paths["labels.json"]
+    else:
+        index_file, labels_file = _legacy_paths(role)
+        if not os.path.exists(index_file) or not os.path.exists(labels_file):
+            return None
+    try:
+        index = faiss.read_index(index_file)
+        faiss.downcast_index(index.index).hnsw.efSearch = EF_SEARCH
+        with open(labels_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        print(f"[people_index] failed to load {role} index: {e}")
+        return None
+    synced_at = datetime.fromisoformat(state["synced_at"]) if state.get("synced_at") else None
+    labels = {int(k): v for k, v in state["labels"].items()}
+    role_index = _RoleIndex(role, index, labels, state["next_id"], synced_at)
+    role_index.signature = signature
+    return role_index
+
+
+def _build(role: str) -> _RoleIndex | None:
+    """Build a role's index from user_embeddings_collection (not installed or saved)."""
+    user_ids, vectors, synced_at = [], [], None
+    for doc in user_embeddings_collection.find(
+        {"role": role}, {"user_id": 1, "embedding": 1, "updated_at": 1}
+    ):
+        vector = normalize_embedding(doc["embedding"])
+        if vector is None or (vectors and vector.shape != vectors[0].shape):
+            continue
+        user_ids.append(doc["user_id"])
+        vectors.append(vector)
+        if doc.get("updated_at") and (synced_at is None or doc["updated_at"] > synced_at):
+            synced_at = doc["updated_at"]
+    if not vectors:
+        return None
+
+    index = _new_faiss_index(vectors[0].shape[0])
+    index.add_with_ids(np.vstack(vectors), np.arange(len(vectors), dtype="int64"))
+    print(f"[people_index] built {role} index with {len(user_ids)} vectors")
+    return _RoleIndex(role, index, dict(enumerate(user_ids)), len(user_ids), synced_at)
+
+
+def _refresh(role_index: _RoleIndex):
+    """Add embeddings written by any worker since the index was last synced."""
+    query = {"role": role_index.role}
+    if role_index.synced_at is not None:
+        query["updated_at"] = {"$gte": role_index.synced_at}
+    for doc in user_embeddings_collection.find(query, {"user_id": 1, "embedding": 1, "updated_at": 1}):
+        vector = normalize_embedding(doc["embedding"])
+        with _lock:
+            if vector is not None and vector.shape[0] == role_index.dim \
+                    and not role_index.has_vector(doc["user_id"], vector):
+                role_index.add(doc["user_id"], vector)
+        if doc.get("updated_at") and (role_index.synced_at is None or doc["updated_at"] > role_index.synced_at):
+            role_index.synced_at = doc["updated_at"]
+
+
+def _install(role_index: _RoleIndex):
+    with _lock:
+        _indexes[role_index.role] = role_index
+
+
+def maintain(role: str):
+    """Bring this worker's index for a role up to date; called by jobs.people_index."""
+    with _lock:
+        role_index = _indexes.get(role)
+    signature = _signature(role)
+    if signature is not None and (role_index is None or role_index.signature != signature):
+        loaded = _load(role)
+        if loaded is not None:
+            _refresh(loaded)
+            _install(loaded)
+            role_index = loaded
+    elif role_index is not None:
+        _refresh(role_index)
+
+    with _builder_lock(role) as builder:
+        if not builder:
+            return
+        if role_index is None or role_index.tombstones > REBUILD_TOMBSTONE_RATIO * max(len(role_index.live), 1):
+            role_index = _build(role)
+            if role_index is None:
+                return
+            role_index.save()
+            _install(role_index)
+        elif role_index.dirty and time.monotonic() - role_index.saved_at >= SAVE_INTERVAL_SECONDS:
+            role_index.save()
+
+
+def upsert(user_id: str, role: str, embedding):
+    """Apply a fresh profile embedding to an already-loaded role index."""
+    vector = normalize_embedding(embedding)
+    if vector is None:
+        return
+    with _lock:
+        for other_role, role_index in _indexes.items():
+            if other_role != role:
+                label = role_index.live.pop(str(user_id), None)
+                if label is not None:
+                    role_index.labels.pop(label, None)
+        role_index = _indexes.get(role)
+        if role_index is not None and role_index.dim == vector.shape[0]:
+            role_index.add(str(user_id), vector)
+
+
+def top_k(role: str, query_embedding, k: int, exclude: set | None = None) -> list | None:
+    """Return up to k (user_id, cosine similarity) pairs, best first, or None
+    while this worker has no index for the role."""
+    query = normalize_embedding(query_embedding)
+    if query is None or k <= 0:
+        return []
+    with _lock:
+        role_index = _indexes.get(role)
+        if role_index is None or role_index.dim != query.shape[0]:
+            return None
+        return role_index.search(query, k, exclude or set())
@@ -0,0 +1,51 @@
+from bson.objectid import ObjectId
+from extensions import (
+    projects_collection,
+    tasks_collection,
+    users_collection,
+    project_activity_collection,
+)
+
+# One read of everything the RAG indexer and the copilot prompt need about a
+# project: four queries regardless of team or task count.
+
+ACTIVITY_LIMIT = 20
+
+_PROJECT_FIELDS = {
+    "title": 1, "description": 1, "notes": 1, "category": 1, "stage": 1,
+    "workspace_status": 1, "workspace_priority": 1, "team_members": 1,
+}
+_TASK_FIELDS = {
+    "title": 1, "description": 1, "status": 1, "priority": 1, "type": 1,
+    "assignee_name": 1, "due_date": 1,
+}
+_ACTIVITY_FIELDS = {"event_type": 1, "actor_name": 1, "message": 1, "created_at": 1}
+_MEMBER_FIELDS = {"name": 1, "role": 1, "skills": 1, "interests": 1}
+
+
+def load_project_snapshot(project_id, activity_limit: int = ACTIVITY_LIMIT) -> dict | None:
+    """Return {"project", "tasks", "activity", "members"} or None if the project is gone.
+
+    Activity is newest first; members keep the project's team_members order.
+    """
+    project = projects_collection.find_one({"_id": ObjectId(project_id)}, _PROJECT_FIELDS)
+    if not project:
+        return None
+
+    tasks = list(tasks_collection.find({
+        "project_id": ObjectId(project_id),
+        "archived": {"$ne": True}
+    }, _TASK_FIELDS))
+
+    activity = list(project_activity_collection.find(
+        {"project_id": ObjectId(project_id)}, _ACTIVITY_FIELDS
+    ).sort("created_at", -1).limit(activity_limit))
+
+    member_ids = project.get("team_members", [])
+    found = {
+        u["_id"]: u
+        for u in users_collection.find({"_id": {"$in": member_ids}}, _MEMBER_FIELDS)
+    } if member_ids else {}
+    members = [found[m] for m in dict.fromkeys(member_ids) if m in found]
+
+    return {"project": project, "tasks": tasks, "activity": activity, "members": members}
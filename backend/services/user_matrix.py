@@ -0,0 +1,248 @@
+import os
+import threading
+import time
+import numpy as np
+from bson import ObjectId
+from extensions import users_collection, user_embeddings_collection
+from services.embedding_gateway import OUTPUT_DIMENSIONALITY
+from utils.embeddings import normalize_embedding
+
+# In-process, role-partitioned matrix of L2-normalised profile embeddings.
+# Ranking a feed is one matrix-vector product over the partition instead of
+# one Mongo read and one numpy allocation per candidate.
+#
+# MATCH_MATRIX_DTYPE=float16|int8 stores rows quantised (int8 with a
+# per-row scale) to cut memory 2-4x; the approximate shortlist is then
+# re-ranked exactly with the float32 vectors from user_embeddings. Only the
+# head that is actually served first (MATCH_MATRIX_RERANK_HEAD) is re-ranked;
+# deeper ranks keep their approximate order.
+#
+# MATCH_PREFIX_DIMS=N keeps only the first N (re-normalised) dimensions in the
+# scan matrix, Matryoshka-style; the shortlist is re-scored at full dimension.
+
+REFRESH_INTERVAL_SECONDS = float(os.getenv("MATCH_MATRIX_REFRESH_SECONDS", "30"))
+MATRIX_DTYPE = os.getenv("MATCH_MATRIX_DTYPE", "float32").lower()
+RERANK_FACTOR = int(os.getenv("MATCH_MATRIX_RERANK_FACTOR", "4"))
+RERANK_HEAD = int(os.getenv("MATCH_MATRIX_RERANK_HEAD", "50"))
+PREFIX_DIMS = int(os.getenv("MATCH_PREFIX_DIMS", "0"))
+SCORE_CHUNK_ROWS = 16384
+
+if MATRIX_DTYPE not in ("float32", "float16", "int8"):
+    raise ValueError(f"Unsupported MATCH_MATRIX_DTYPE: {MATRIX_DTYPE}")
+_STORAGE_DTYPE = {"float32": np.float32, "float16": np.float16, "int8": np.int8}[MATRIX_DTYPE]
+
+_lock = threading.RLock()
+_partitions = {}
+_roles = {}
+_synced_at = None
+_synced_ids = set()     # user_ids already applied at exactly _synced_at
+_checked_at = 0.0
+
+
+def _quantize(vector: np.ndarray) -> tuple:
+    """Encode a normalised vector in MATRIX_DTYPE; returns (row, scale)."""
+    if MATRIX_DTYPE == "int8":
+        peak = float(np.abs(vector).max())
+        scale = peak / 127.0 if peak else 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+    return vector.astype(_STORAGE_DTYPE), 1.0
+
+
+class _RolePartition:
+    def __init__(self, role: str):
+        self.role = role
+        self.ids = []
+        self.rows = {}
+        self.matrix = np.zeros((0, 0), dtype=_STORAGE_DTYPE)
+        self.scales = np.ones(0, dtype=np.float32)
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def view(self) -> np.ndarray:
+        return self.matrix[:self.size]
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate cosine scores for every row, decoded in cache-sized chunks."""
+        if MATRIX_DTYPE == "float32":
+            return self.view() @ query
+        out = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCORE_CHUNK_ROWS):
+            end = min(start + SCORE_CHUNK_ROWS, self.size)
+            out[start:end] = self.matrix[start:end].astype(np.float32) @ query
+        if MATRIX_DTYPE == "int8":
+            out *= self.scales[:self.size]
+        return out
+
+    def upsert(self, user_id: str, vector: np.ndarray):
+        encoded, scale = _quantize(vector)
+        row = self.rows.get(user_id)
+        if row is not None:
+            self.matrix[row] = encoded
+            self.scales[row] = scale
+            return
+        if self.size == 0 and self.dim != vector.shape[0]:
+            self.matrix = np.zeros((64, vector.shape[0]), dtype=_STORAGE_DTYPE)
+            self.scales = np.ones(64, dtype=np.float32)
+        if self.size == self.matrix.shape[0]:
+            capacity = max(64, self.size * 2)
+            grown = np.zeros((capacity, self.dim), dtype=_STORAGE_DTYPE)
+            grown[:self.size] = self.view()
+            self.matrix = grown
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:self.size] = self.scales[:self.size]
+            self.scales = scales
+        self.matrix[self.size] = encoded
+        self.scales[self.size] = scale
+        self.rows[user_id] = self.size
+        self.ids.append(user_id)
+
+    def remove(self, user_id: str):
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.scales[row] = self.scales[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+
+
+def _partition(role: str) -> _RolePartition:
+    part = _partitions.get(role)
+    if part is None:
+        part = _partitions[role] = _RolePartition(role)
+    return part
+
+
+def _scan_vector(embedding) -> np.ndarray | None:
+    return normalize_embedding(embedding, PREFIX_DIMS or OUTPUT_DIMENSIONALITY)
+
+
+def _apply(user_id: str, role: str, embedding) -> bool:
+    vector = _scan_vector(embedding)
+    if vector is None:
+        return False
+    part = _partition(role)
+    if part.size and part.dim != vector.shape[0]:
+        print(f"[user_matrix] skipping {user_id}: dim {vector.shape[0]} != {part.dim}")
+        return False
+    previous = _roles.get(user_id)
+    if previous is not None and previous != role:
+        _partition(previous).remove(user_id)
+    part.upsert(user_id, vector)
+    _roles[user_id] = role
+    return True
+
+
+def upsert(user_id: str, role: str, embedding):
+    with _lock:
+        _apply(str(user_id), role or "student", embedding)
+
+
+def refresh(force: bool = False):
+    """Pull embeddings written since the last sync (by any worker) into the matrix.
+
+    Users with no embedding at all are picked up by jobs.embedding_backfill,
+    not here, so a feed request never waits on the embedding API.
+    """
+    global _synced_at, _synced_ids, _checked_at
+    now = time.monotonic()
+    if not force and _checked_at and now - _checked_at < REFRESH_INTERVAL_SECONDS:
+        return
+    _checked_at = now
+
+    query = {} if _synced_at is None else {"updated_at": {"$gte": _synced_at}}
+    docs = [
+        d for d in user_embeddings_collection.find(
+            query, {"user_id": 1, "role": 1, "embedding": 1, "updated_at": 1}
+        )
+        # $gte so writes sharing the watermark's millisecond aren't missed;
+        # the ones already applied are dropped here.
+        if not (d.get("updated_at") == _synced_at and d["user_id"] in _synced_ids)
+    ]
+    if not docs:
+        return
+
+    unknown_roles = [ObjectId(d["user_id"]) for d in docs if not d.get("role")]
+    roles = {}
+    if unknown_roles:
+        roles = {
+            str(u["_id"]): u.get("role", "student")
+            for u in users_collection.find({"_id": {"$in": unknown_roles}}, {"role": 1})
+        }
+        # Older embedding docs predate the role field; backfill it once so the
+        # per-role ANN index can filter on it.
+        for role in set(roles.values()):
+            user_embeddings_collection.update_many(
+                {"user_id": {"$in": [uid for uid, r in roles.items() if r == role]}},
+                {"$set": {"role": role}},
+            )
+
+    with _lock:
+        for doc in docs:
+            role = doc.get("role") or roles.get(doc["user_id"])
+            if role is None:
+                continue
+            _apply(doc["user_id"], role, doc["embedding"])
+        stamps = [d["updated_at"] for d in docs if d.get("updated_at")]
+        if stamps:
+            watermark = max(stamps)
+            at_watermark = {d["user_id"] for d in docs if d.get("updated_at") == watermark}
+            _synced_ids = (_synced_ids | at_watermark) if watermark == _synced_at else at_watermark
+            _synced_at = watermark
+
+
+def partition_size(role: str) -> int:
+    with _lock:
+        part = _partitions.get(role)
+        return part.size if part else 0
+
+
+def _rerank_head(query: np.ndarray, shortlist: list, head: int, k: int) -> list:
+    """Re-score the top of an approximate shortlist with the stored float32
+    vectors; the best head of those lead, the rest keep approximate order."""
+    candidates = shortlist[:head * RERANK_FACTOR]
+    exact = {}
+    for doc in user_embeddings_collection.find(
+        {"user_id": {"$in": [uid for uid, _ in candidates]}}, {"user_id": 1, "embedding": 1}
+    ):
+        vector = normalize_embedding(doc["embedding"])
+        if vector is not None and vector.shape == query.shape:
+            exact[doc["user_id"]] = float(vector @ query)
+    rescored = [(uid, exact.get(uid, approx)) for uid, approx in candidates]
+    rescored.sort(key=lambda x: x[1], reverse=True)
+    leaders = rescored[:head]
+    taken = {uid for uid, _ in leaders}
+    return (leaders + [item for item in shortlist if item[0] not in taken])[:k]
+
+
+def top_k(role: str, query_embedding, k: int, exclude: set | None = None) -> list:
+    """Return up to k (user_id, cosine similarity) pairs, best first."""
+    query = _scan_vector(query_embedding)
+    if query is None or k <= 0:
+        return []
+    exact = MATRIX_DTYPE == "float32" and not PREFIX_DIMS
+    with _lock:
+        part = _partitions.get(role)
+        if part is None or part.size == 0 or part.dim != query.shape[0]:
+            return []
+        scores = part.scores(query)
+        if exclude:
+            rows = [part.rows[x] for x in exclude if x in part.rows]
+            if rows:
+                scores[rows] = -np.inf
+        head = min(k, RERANK_HEAD)
+        n = min(k if exact else max(k, head * RERANK_FACTOR), part.size)
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        shortlist = [(part.ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+    return shortlist if exact else _rerank_head(normalize_embedding(query_embedding), shortlist, head, k)
@@ -0,0 +1,8 @@
+# Name of the unique index dedupe_users.py creates; the /api/users/match read
+# path checks for it to skip its own de-duplication.
+EMAIL_INDEX_NAME = "email_normalized_unique"
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form used for the unique users.email_normalized index."""
+    return (email or "").strip().lower()
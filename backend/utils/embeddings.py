@@ -1,15 +1,30 @@
-from google import genai
-import os
+import numpy as np
+from services import embedding_gateway
+from services.embedding_gateway import OUTPUT_DIMENSIONALITY
 
-_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))  # keep Gemini for embeddings
 
 def generate_embedding(text: str):
     try:
-        response = _client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=text
-        )
-        return response.embeddings[0].values
+        return embedding_gateway.embed(text)
     except Exception as e:
         print(f"[EMBEDDING ERROR] {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def generate_embeddings(texts: list):
+    try:
+        return embedding_gateway.embed_many(texts)
+    except Exception as e:
+        print(f"[EMBEDDING ERROR] {e}")
+        raise
+
+
+def normalize_embedding(vector, dims: int | None = OUTPUT_DIMENSIONALITY) -> np.ndarray | None:
+    """L2-normalise, truncating to dims first (a Matryoshka prefix stays meaningful)."""
+    v = np.asarray(vector, dtype=np.float32)
+    if dims and v.ndim == 1 and v.shape[0] > dims:
+        v = v[:dims]
+    norm = np.linalg.norm(v)
+    if v.ndim != 1 or norm == 0:
+        return None
+    return v / norm
@@ -699,7 +699,7 @@ useEffect(() => {
 )}
 
 {activeTab === 'matchmaking' && (
-  <Matchmaking userId={user.id} userRole={user.role} />
+  <Matchmaking userId={user.id} userRole={user.role} socket={socket} />
 )}
 
       </main>
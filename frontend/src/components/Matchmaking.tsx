@@ -1,10 +1,12 @@
 import { useState, useEffect } from 'react';
+import type { Socket } from 'socket.io-client';
 import { MatchmakingService, type FeedItem, type FeedType } from '../services/matchmakingService';
 import './Matchmaking.css';
 
 interface MatchmakingProps {
   userId: string;
   userRole?: string;
+  socket?: Socket | null;
 }
 
 const STUDENT_TABS: { type: FeedType; label: string; icon: string; targetType: 'user' | 'mentor' | 'project' | null }[] = [
@@ -33,7 +35,7 @@ const AvatarCircle = ({ name, variant }: { name: string; variant: 'teammate' | '
   </div>
 );
 
-export default function Matchmaking({ userId: _userId, userRole }: MatchmakingProps) {
+export default function Matchmaking({ userId: _userId, userRole, socket }: MatchmakingProps) {
   const isMentor = userRole === 'mentor';
   const TAB_CONFIG = isMentor ? MENTOR_TABS : STUDENT_TABS;
   const [tab, setTab] = useState<FeedType>('teammates');
@@ -66,6 +68,19 @@ export default function Matchmaking({ userId: _userId, userRole }: MatchmakingPr
 
   useEffect(() => { loadFeed(tab); }, [tab]);
 
+  // AI explanations that weren't cached arrive after the feed over Socket.IO.
+  useEffect(() => {
+    if (!socket) return;
+    const handleExplanation = (data: { feed_type: FeedType; id: string; ai_explanation: string }) => {
+      if (data.feed_type !== tab) return;
+      setFeed(prev => prev.map(f => (f.id === data.id ? { ...f, ai_explanation: data.ai_explanation } : f)));
+    };
+    socket.on('match_explanation', handleExplanation);
+    return () => {
+      socket.off('match_explanation', handleExplanation);
+    };
+  }, [socket, tab]);
+
   const handleAction = async (action: 'like' | 'skip') => {
     const item = feed[index];
     if (!item || actionLoading) return;